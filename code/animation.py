@@ -0,0 +1,29 @@
+from settings import *
+
+class AnimationClock:
+    # one frame counter per asset list, shared by every sprite that plays it in phase
+    def __init__(self):
+        self.tracks = {}
+        self.changed = set()
+
+    def register(self, frames):
+        if id(frames) not in self.tracks:
+            self.tracks[id(frames)] = [frames, 0]
+
+    def update(self, dt):
+        self.changed = set()
+
+        for key, track in self.tracks.items():
+            idx = int(track[1])
+            track[1] += ANIM_SPEED * dt
+            track[1] = 0 if track[1] >= len(track[0]) else track[1]
+
+            if int(track[1]) != idx:
+                self.changed.add(key)
+
+    def has_changed(self, frames):
+        # whether the last update moved this list to another frame
+        return id(frames) in self.changed
+
+    def frame(self, frames):
+        return frames[int(self.tracks[id(frames)][1])]
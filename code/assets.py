@@ -0,0 +1,112 @@
+import re
+import json
+import time
+from os import walk
+from os.path import exists
+from concurrent.futures import ThreadPoolExecutor
+import pygame as pg
+from settings import *
+
+def natural_key(name):
+    # '10.png' sorts after '2.png'
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+def walk_sorted(path):
+    # os.walk with folders and files in natural order, frame order no longer depends on the file system
+    for folder, subs, files in walk(path):
+        subs.sort(key = natural_key)
+        yield folder, subs, sorted(files, key = natural_key)
+
+class AssetRegistry:
+    # every image path is decoded once, in parallel, and converted on the main thread
+    def __init__(self, workers, atlas_index):
+        self.workers = workers
+        self.surfs = {}
+        self.folders = {}
+
+        # frames packed by pack_assets.py come out of a few atlas sheets instead of single files
+        self.atlas = None
+        if exists(atlas_index):
+            with open(atlas_index) as file:
+                self.atlas = json.load(file)
+            self.atlas_folder = atlas_index.rsplit('/', 1)[0]
+            self.sheets = {}
+
+        # per group: files, seconds, bytes
+        self.stats = {}
+
+    def walk(self, path):
+        if self.atlas is None:
+            yield from walk_sorted(path)
+            return
+
+        if path in self.atlas['folders']:
+            subs, files = self.atlas['folders'][path]
+            yield path, subs, files
+            for sub in subs:
+                yield from self.walk(f'{path}/{sub}')
+
+    def get_files(self, path):
+        return [f'{folder}/{file}' for folder, sub, files in self.walk(path) for file in files]
+
+    def decode(self, files):
+        # decoding runs in the threads, convert_alpha needs the display so it stays here
+        with ThreadPoolExecutor(self.workers) as pool:
+            return [surf.convert_alpha() for surf in pool.map(pg.image.load, files)]
+
+    def preload(self, paths, group):
+        # paths are files or folders, folders are loaded with everything below them
+        start = time.perf_counter()
+
+        files = []
+        for path in paths:
+            for file in (self.get_files(path) if not path.endswith('.png') else [path]):
+                if file not in self.surfs and file not in files:
+                    files.append(file)
+
+        if not files:
+            return
+
+        if self.atlas is not None and all(file in self.atlas['frames'] for file in files):
+            # only sheets that aren't open yet count towards memory
+            sheet_ids = sorted({self.atlas['frames'][file][0] for file in files} - self.sheets.keys())
+            new_sheets = self.decode([f"{self.atlas_folder}/{self.atlas['sheets'][idx]}" for idx in sheet_ids])
+            self.sheets.update(zip(sheet_ids, new_sheets))
+
+            for file in files:
+                sheet, x, y, width, height = self.atlas['frames'][file]
+                self.surfs[file] = self.sheets[sheet].subsurface((x, y, width, height))
+            loaded = new_sheets
+        else:
+            loaded = self.decode(files)
+            self.surfs.update(zip(files, loaded))
+
+        stats = self.stats.setdefault(group, {'files' : 0, 'time' : 0, 'bytes' : 0})
+        stats['files'] += len(files)
+        stats['time'] += time.perf_counter() - start
+        stats['bytes'] += sum(surf.get_pitch() * surf.get_height() for surf in loaded)
+
+    def image(self, path, group = 'other'):
+        if path not in self.surfs:
+            self.preload([path], group)
+
+        return self.surfs[path]
+
+    def folder(self, path, group = 'other'):
+        # the same list for every caller
+        if path not in self.folders:
+            self.preload([path], group)
+            self.folders[path] = [self.surfs[file] for file in self.get_files(path)]
+
+        return self.folders[path]
+
+    def folder_dict(self, path, group = 'other'):
+        return {file.split('/')[-1].split('.')[0] : surf for file, surf in zip(self.get_files(path), self.folder(path, group))}
+
+    def subfolders(self, path, group = 'other'):
+        return {name : self.folder(f'{path}/{name}', group) for name in next(self.walk(path))[1]}
+
+    def report(self):
+        return {group : dict(stats) for group, stats in self.stats.items()}
+
+assets = AssetRegistry(ASSET_WORKERS, ATLAS_INDEX)
@@ -0,0 +1,75 @@
+import pygame as pg
+from settings import *
+
+class MusicPlayer:
+    # streams one track through pg.mixer.music, a new track fades the current one out and itself in
+    def __init__(self, fade):
+        self.fade = fade
+        self.track = None
+        self.queued = None
+        self.volume = 0
+        self.target_volume = 0
+
+    def play(self, path, volume):
+        if path == self.track and not self.queued:
+            self.target_volume = volume
+        else:
+            self.queued = (path, volume)
+
+    def stop(self):
+        pg.mixer.music.stop()
+        self.track = None
+        self.queued = None
+        self.volume = 0
+
+    def update(self, dt):
+        step = dt / self.fade
+
+        if self.queued:
+            # the mixer has a single music stream, the old track has to be silent before the next one starts
+            if self.track and self.volume > 0:
+                self.volume = max(0, self.volume - step * self.target_volume)
+            else:
+                self.track, self.target_volume = self.queued
+                self.queued = None
+                pg.mixer.music.load(self.track)
+                pg.mixer.music.play(loops = -1)
+        else:
+            self.volume = min(self.target_volume, self.volume + step * self.target_volume)
+
+        pg.mixer.music.set_volume(self.volume)
+
+class VoicePool:
+    # a fixed set of reserved channels shared by the sound effects
+    def __init__(self, count):
+        pg.mixer.set_num_channels(max(pg.mixer.get_num_channels(), count))
+        pg.mixer.set_reserved(count)
+        self.channels = [pg.mixer.Channel(idx) for idx in range(count)]
+
+    def get_channel(self):
+        for channel in self.channels:
+            if not channel.get_busy():
+                return channel
+
+class SoundEffect:
+    # plays on a free pool channel, at most limit copies of it at once
+    def __init__(self, path, pool, limit):
+        self.sound = pg.mixer.Sound(path)
+        self.pool = pool
+        self.limit = limit
+        self.channels = []
+
+    def set_volume(self, volume):
+        self.sound.set_volume(volume)
+
+    def play(self):
+        self.channels = [channel for channel in self.channels if channel.get_sound() is self.sound]
+        if len(self.channels) >= self.limit:
+            return
+
+        channel = self.pool.get_channel()
+        if channel:
+            channel.play(self.sound)
+            self.channels.append(channel)
+
+music = MusicPlayer(MUSIC_FADE)
@@ -0,0 +1,72 @@
+import numpy as np
+from settings import *
+
+# one bit per neighbor, in NEIGHBOR_DIRECTIONS order so masks map back to the land tile names
+NEIGHBOR_BITS = [(1 << bit, offset) for bit, offset in enumerate(NEIGHBOR_DIRECTIONS.values())]
+TERRAIN_KEYS = [''.join(name for bit, name in enumerate(NEIGHBOR_DIRECTIONS) if mask & 1 << bit) for mask in range(256)]
+
+def tile_table(land_tiles):
+    # mask -> land tile key, shapes without a graphic fall back to 'X'
+    return [key if key in land_tiles else 'X' for key in TERRAIN_KEYS]
+
+def terrain_mask(canvas, cell):
+    mask = 0
+    for bit, (x, y) in NEIGHBOR_BITS:
+        neighbor = (cell[0] + x, cell[1] + y)
+        if neighbor in canvas and canvas[neighbor].has_terrain:
+            mask |= bit
+
+    return mask
+
+def retile(canvas, area = None):
+    # recomputes terrain masks and water tops of every tile in area (left, top, right, bottom), the whole canvas by default,
+    # one occupied chunk at a time so memory doesn't grow with the empty space between tiles
+    if area is None:
+        keys = list(canvas.chunks)
+    else:
+        keys = [(chunk_col, chunk_row) for chunk_col in range(area[0] // CHUNK_SIZE, area[2] // CHUNK_SIZE + 1)
+                for chunk_row in range(area[1] // CHUNK_SIZE, area[3] // CHUNK_SIZE + 1) if (chunk_col, chunk_row) in canvas.chunks]
+
+    for chunk_col, chunk_row in keys:
+        left, top = chunk_col * CHUNK_SIZE, chunk_row * CHUNK_SIZE
+        right, bottom = left + CHUNK_SIZE - 1, top + CHUNK_SIZE - 1
+
+        if area is not None:
+            left, top = max(left, area[0]), max(top, area[1])
+            right, bottom = min(right, area[2]), min(bottom, area[3])
+            if left > right or top > bottom:
+                continue
+
+        retile_area(canvas, left, top, right, bottom)
+
+def retile_area(canvas, left, top, right, bottom):
+    width, height = right - left + 1, bottom - top + 1
+
+    # dense grids of the area plus a border of neighbors
+    cells = list(canvas.get_area(left - 1, top - 1, right + 1, bottom + 1))
+    if not cells:
+        return
+
+    count = len(cells)
+    cols = np.fromiter((cell[0] for cell, tile in cells), int, count) - (left - 1)
+    rows = np.fromiter((cell[1] for cell, tile in cells), int, count) - (top - 1)
+
+    terrain = np.zeros((height + 2, width + 2), dtype = np.uint8)
+    water = np.zeros((height + 2, width + 2), dtype = bool)
+    terrain[rows, cols] = np.fromiter((tile.has_terrain for cell, tile in cells), bool, count)
+    water[rows, cols] = np.fromiter((tile.has_water for cell, tile in cells), bool, count)
+
+    masks = np.zeros((height, width), dtype = np.uint8)
+    for bit, (x, y) in NEIGHBOR_BITS:
+        masks |= terrain[1 + y : 1 + y + height, 1 + x : 1 + x + width] * np.uint8(bit)
+
+    # water with more water above it
+    tops = water[1 : 1 + height, 1 : 1 + width] & water[: height, 1 : 1 + width]
+
+    inside = np.flatnonzero((cols >= 1) & (cols <= width) & (rows >= 1) & (rows <= height))
+    inside_rows, inside_cols = rows[inside] - 1, cols[inside] - 1
+
+    for idx, mask, water_top in zip(inside.tolist(), masks[inside_rows, inside_cols].tolist(), tops[inside_rows, inside_cols].tolist()):
+        tile = cells[idx][1]
+        tile.terrain_mask = mask
+        tile.water_top = water_top
@@ -0,0 +1,67 @@
+from collections.abc import MutableMapping
+from settings import *
+
+def cell_chunk(cell):
+    return cell[0] // CHUNK_SIZE, cell[1] // CHUNK_SIZE
+
+class CanvasStore(MutableMapping):
+    # canvas tiles by cell, bucketed into chunks of CHUNK_SIZE x CHUNK_SIZE cells
+    def __init__(self):
+        self.chunks = {}
+        self.count = 0
+
+    def __getitem__(self, cell):
+        return self.chunks[cell_chunk(cell)][cell]
+
+    def __setitem__(self, cell, tile):
+        chunk = self.chunks.setdefault(cell_chunk(cell), {})
+        if cell not in chunk:
+            self.count += 1
+        chunk[cell] = tile
+
+    def __delitem__(self, cell):
+        key = cell_chunk(cell)
+        chunk = self.chunks[key]
+        del chunk[cell]
+        self.count -= 1
+
+        if not chunk:
+            del self.chunks[key]
+
+    def __contains__(self, cell):
+        chunk = self.chunks.get(cell_chunk(cell))
+        return chunk is not None and cell in chunk
+
+    def __iter__(self):
+        for chunk in self.chunks.values():
+            yield from chunk
+
+    def __len__(self):
+        return self.count
+
+    def get_bounds(self):
+        # top left cell, only the outermost chunks are searched
+        left = min(key[0] for key in self.chunks)
+        top = min(key[1] for key in self.chunks)
+
+        return (min(cell[0] for key, chunk in self.chunks.items() if key[0] == left for cell in chunk),
+                min(cell[1] for key, chunk in self.chunks.items() if key[1] == top for cell in chunk))
+
+    def get_extent(self):
+        # (left, top, right, bottom) cells covered by the occupied chunks
+        cols = [key[0] for key in self.chunks]
+        rows = [key[1] for key in self.chunks]
+
+        return min(cols) * CHUNK_SIZE, min(rows) * CHUNK_SIZE, (max(cols) + 1) * CHUNK_SIZE - 1, (max(rows) + 1) * CHUNK_SIZE - 1
+
+    def get_area(self, left, top, right, bottom):
+        # tiles inside the cell range, bounds included, only overlapping chunks are visited
+        for chunk_col in range(left // CHUNK_SIZE, right // CHUNK_SIZE + 1):
+            for chunk_row in range(top // CHUNK_SIZE, bottom // CHUNK_SIZE + 1):
+                chunk = self.chunks.get((chunk_col, chunk_row))
+                if not chunk:
+                    continue
+
+                for cell, tile in chunk.items():
+                    if left <= cell[0] <= right and top <= cell[1] <= bottom:
+                        yield cell, tile
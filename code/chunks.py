@@ -0,0 +1,60 @@
+import pygame as pg
+from settings import *
+
+def chunk_key(pos):
+    return int(pos[0] // CHUNK_PX), int(pos[1] // CHUNK_PX)
+
+def chunk_range(rect):
+    left, top = chunk_key(rect.topleft)
+    right, bottom = chunk_key(rect.bottomright)
+
+    return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+def merge_runs(positions):
+    # merges horizontal runs of tiles into single collision rects
+    rows = {}
+    for x, y in positions:
+        rows.setdefault(y, []).append(x)
+
+    rects = []
+    for y, xs in rows.items():
+        xs.sort()
+        start = prev = xs[0]
+
+        for x in xs[1:]:
+            if x != prev + TILE_SIZE:
+                rects.append(pg.Rect(start, y, prev - start + TILE_SIZE, TILE_SIZE))
+                start = x
+            prev = x
+
+        rects.append(pg.Rect(start, y, prev - start + TILE_SIZE, TILE_SIZE))
+
+    return rects
+
+class TerrainChunks:
+    def __init__(self, z):
+        self.z = z
+        self.surfs = {}
+
+    def bake(self, key, tiles):
+        # the surface only covers the tiles, sparse chunks stay small
+        left = min(x for (x, y), tile_surf in tiles)
+        top = min(y for (x, y), tile_surf in tiles)
+        right = max(x for (x, y), tile_surf in tiles) + TILE_SIZE
+        bottom = max(y for (x, y), tile_surf in tiles) + TILE_SIZE
+
+        surf = pg.Surface((right - left, bottom - top), pg.SRCALPHA)
+        surf.blits([(tile_surf, (x - left, y - top)) for (x, y), tile_surf in tiles], doreturn = False)
+        self.surfs[key] = (surf, (left, top))
+
+    def evict(self, key):
+        self.surfs.pop(key, None)
+
+    def draw(self, surface, view, offset):
+        blit_list = []
+        for key in chunk_range(view):
+            if key in self.surfs:
+                surf, (x, y) = self.surfs[key]
+                blit_list.append((surf, (x - offset[0], y - offset[1])))
+
+        surface.blits(blit_list, doreturn = False)
@@ -0,0 +1,61 @@
+import numpy as np
+from random import getrandbits
+from settings import *
+from support import transforms
+
+class CloudField:
+    # every cloud is one slot in a set of arrays, moved in a single vectorized step
+    def __init__(self, surfs, count, start_x, respawn_x, left_limit, height, speed, scale_chance):
+        # big clouds are the scaled variants at the back of the list
+        self.surfs = surfs + [transforms.scale2x(surf) for surf in surfs]
+        self.widths = np.array([surf.get_width() for surf in self.surfs])
+        self.heights = np.array([surf.get_height() for surf in self.surfs])
+
+        # seeded from random so a seeded run places the same clouds
+        self.rng = np.random.default_rng(getrandbits(32))
+        self.respawn_x = respawn_x
+        self.left_limit = left_limit
+        self.height = height
+        self.speed = speed
+        self.scale_chance = scale_chance
+
+        # x from the left edge, y as the distance above the horizon
+        self.x = self.rng.uniform(start_x[0], start_x[1], count)
+        self.y = np.zeros(count)
+        self.speeds = np.zeros(count)
+        self.kinds = np.zeros(count, dtype = int)
+        self.roll(np.ones(count, dtype = bool))
+
+    def roll(self, mask):
+        count = int(mask.sum())
+        scaled = self.rng.random(count) < self.scale_chance
+
+        self.y[mask] = self.rng.integers(self.height[0], self.height[1], count, endpoint = True)
+        self.speeds[mask] = self.rng.integers(self.speed[0], self.speed[1], count, endpoint = True)
+        self.kinds[mask] = self.rng.integers(0, len(self.surfs) // 2, count) + scaled * (len(self.surfs) // 2)
+
+    def update(self, dt):
+        self.x -= self.speeds * dt
+
+        # clouds past the left limit come back in from the right
+        gone = self.x <= self.left_limit
+        if gone.any():
+            self.x[gone] = self.rng.uniform(self.respawn_x[0], self.respawn_x[1], int(gone.sum()))
+            self.roll(gone)
+
+    def get_visible(self, origin_x, horizon_y):
+        x = np.round(self.x - origin_x).astype(int)
+        y = horizon_y - self.y.astype(int)
+        widths = self.widths[self.kinds]
+        heights = self.heights[self.kinds]
+
+        visible = np.flatnonzero((x < WINDOW_WIDTH) & (x + widths > 0) & (y < WINDOW_HEIGHT) & (y + heights > 0))
+        return zip(visible.tolist(), self.kinds[visible].tolist(), x[visible].tolist(), y[visible].tolist())
+
+    def get_rects(self, origin_x, horizon_y):
+        # screen rects of the visible clouds by slot
+        return {idx : self.surfs[kind].get_rect(topleft = (x, y)) for idx, kind, x, y in self.get_visible(origin_x, horizon_y)}
+
+    def draw(self, surface, origin_x, horizon_y):
+        blit_list = [(self.surfs[kind], (x, y)) for idx, kind, x, y in self.get_visible(origin_x, horizon_y)]
+        surface.blits(blit_list, doreturn = False)
@@ -1,12 +1,21 @@
 import pygame as pg
 from pygame.math import Vector2 as vector
-from pygame.image import load
 import sys
+import os
+from math import floor
 from settings import *
 from support import *
+from assets import assets
+from audio import music
 from menu import Menu
 from timer import Timer
-from random import choice, randint
+from animation import AnimationClock
+from clouds import CloudField
+from canvas import CanvasStore
+from history import EditHistory
+from levelfile import save_layers, load_layers, save_grid, load_grid
+from levelcache import entry_hash, layer_sum, grid_key, file_hash
+from autotile import tile_table, terrain_mask, retile
 
 class Editor:
     def __init__(self, land_tiles, switch):
@@ -15,36 +24,64 @@ class Editor:
         self.switch = switch
 
         # support
-        self.canvas_data = {}
+        self.canvas_data = CanvasStore()
 
         # imports
         self.land_tiles = land_tiles
+        self.land_keys = tile_table(land_tiles)
         self.import_file()
 
-        # clouds
-        self.current_clouds = []
-        self.cloud_surf = import_folder('../graphics/clouds')
-        self.cloud_timer = pg.USEREVENT + 1
-        pg.time.set_timer(self.cloud_timer, 2000)
-        self.start_clouds()
+        # clouds, y is measured up from the horizon
+        self.cloud_surf = assets.folder('../graphics/clouds', 'editor')
+        self.clouds = CloudField(self.cloud_surf, 25, (0, WINDOW_WIDTH), (WINDOW_WIDTH + 50, WINDOW_WIDTH + 100), -400, (0, WINDOW_HEIGHT), (20, 50), 2 / 5)
 
         # navigation
         self.origin = vector()
         self.pan_active = False
         self.pan_offset = vector()
 
-        # support lines
-        self.support_line_surf = pg.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-        self.support_line_surf.set_colorkey('green')
-        self.support_line_surf.set_alpha(30)
+        # support lines, drawn once a tile larger than the window and moved with the origin
+        self.support_line_surf = pg.Surface((WINDOW_WIDTH + TILE_SIZE, WINDOW_HEIGHT + TILE_SIZE))
+        self.support_line_surf.fill('green')
+        self.support_line_surf.set_colorkey('green', pg.RLEACCEL)
+        self.support_line_surf.set_alpha(30, pg.RLEACCEL)
+
+        for x in range(0, WINDOW_WIDTH + TILE_SIZE, TILE_SIZE):
+            pg.draw.line(self.support_line_surf, LINE_COLOR, (x, 0), (x, WINDOW_HEIGHT + TILE_SIZE))
+
+        for y in range(0, WINDOW_HEIGHT + TILE_SIZE, TILE_SIZE):
+            pg.draw.line(self.support_line_surf, LINE_COLOR, (0, y), (WINDOW_WIDTH + TILE_SIZE, y))
 
         # selection
         self.selection_idx = 2
         self.last_cell = None
 
+        # exported grid, updated from the cells edited since the last export
+        self.grid = None
+        self.grid_origin = None
+        self.dirty_cells = set()
+        self.grid_sum = 0
+        self.export_key = None
+        self.bg_obj_ids = {key for key, value in EDITOR_DATA.items() if value['style'] == 'palm_bg'}
+
+        # undo, one step per mouse press or key edit
+        self.history = EditHistory(UNDO_MAX_BYTES, UNDO_MAX_STEPS)
+
+        # region edits, shift + drag fills or erases a rectangle, ctrl + click flood fills
+        self.region_start = None
+        self.region_erase = False
+
         # menu
         self.menu = Menu()
 
+        # dirty rects, what was on screen last frame
+        self.full_redraw = True
+        self.last_origin = vector()
+        self.last_selection = self.selection_idx
+        self.last_preview = None
+        self.cloud_rects = {}
+        self.obj_rects = {}
+
         # objs
         self.canvas_objs = pg.sprite.Group()
         self.fg = pg.sprite.Group()
@@ -53,15 +90,13 @@ class Editor:
         self.obj_timer = Timer(400)
         
         # player
-        CanvasObj((200, WINDOW_HEIGHT / 2), self.animations[0]['frames'], 0, self.origin, [self.canvas_objs, self.fg])
+        CanvasObj((200, WINDOW_HEIGHT / 2), self.animations[0], 0, self.origin, self.animation_clock, [self.canvas_objs, self.fg])
 
         # sky
-        self.sky_handle = CanvasObj((WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2), [self.sky_handle_surf], 1, self.origin, [self.canvas_objs, self.bg])
+        self.sky_handle = CanvasObj((WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2), [self.sky_handle_surf], 1, self.origin, self.animation_clock, [self.canvas_objs, self.bg])
 
         # music
-        self.editor_music = pg.mixer.Sound('../audio/Explorer.ogg')
-        self.editor_music.set_volume(0.4)
-        self.editor_music.play(loops = -1)
+        self.play_music()
 
     # support
     def get_current_cell(self, obj = None):
@@ -80,121 +115,125 @@ class Editor:
         return col, row
 
     def check_neighbors(self, cell_pos):
-        # create cluster
-        cluster_size = 3
-        local_cluster = [
-			(cell_pos[0] + col - int(cluster_size / 2), cell_pos[1] + row - int(cluster_size / 2)) 
-			for col in range(cluster_size) 
-			for row in range(cluster_size)]
-        
-        # check neigbors
-        for cell in local_cluster:
-             if cell in self.canvas_data:
-                self.canvas_data[cell].terrain_neighbors = []
-                self.canvas_data[cell].water_top = False
-
-                for name, side in NEIGHBOR_DIRECTIONS.items():
-                    neighbor_cell = (cell[0] + side[0],cell[1] + side[1])
-                    
+        # the 3x3 cluster around a single edit
+        self.mark_dirty((col, row) for col in range(cell_pos[0] - 1, cell_pos[0] + 2) for row in range(cell_pos[1] - 1, cell_pos[1] + 2))
+
+        for col in range(cell_pos[0] - 1, cell_pos[0] + 2):
+            for row in range(cell_pos[1] - 1, cell_pos[1] + 2):
+                cell = (col, row)
+
+                if cell in self.canvas_data:
+                    tile = self.canvas_data[cell]
+                    tile.terrain_mask = terrain_mask(self.canvas_data, cell)
 
-                    if neighbor_cell in self.canvas_data:
-                        # water top neighbor
-                        if self.canvas_data[neighbor_cell].has_water and self.canvas_data[cell].has_water and name == 'A':
-                            self.canvas_data[cell].water_top = True
+                    # water top neighbor
+                    above = (col, row - 1)
+                    tile.water_top = tile.has_water and above in self.canvas_data and self.canvas_data[above].has_water
 
-                    # terrain neighbors
-                        if self.canvas_data[neighbor_cell].has_terrain:
-                            self.canvas_data[cell].terrain_neighbors.append(name)
+    def retile(self, area = None):
+        # bulk version of check_neighbors for a cell area or the whole canvas
+        retile(self.canvas_data, area)
+
+        if area:
+            self.mark_dirty(cell for cell, tile in self.canvas_data.get_area(*area))
+        else:
+            self.grid = None
 
     def import_file(self):
-        self.water_bot = load('../graphics/terrain/water/water_bottom.png').convert_alpha()
-        self.sky_handle_surf = load('../graphics/cursors/handle.png').convert_alpha()
+        # everything the editor shows, decoded together and shared with the level
+        assets.preload([value[key] for value in EDITOR_DATA.values() for key in ('graphics', 'preview') if value[key]] + ['../graphics/cursors', '../graphics/clouds'], 'editor')
+
+        self.water_bot = assets.image('../graphics/terrain/water/water_bottom.png', 'editor')
+        self.sky_handle_surf = assets.image('../graphics/cursors/handle.png', 'editor')
 
         # animations
         self.animations = {}
+        self.animation_clock = AnimationClock()
 
         for key, value in EDITOR_DATA.items():
             if value['graphics']:
-                graphics = import_folder(value['graphics'])
-                self.animations[key] = {
-                    'frame index' : 0,
-                    'frames' : graphics,
-                    'length' : len(graphics)
-                }
-
-        # preview
-        self.preview_surf = {key : load(value['preview']) for key, value in EDITOR_DATA.items() if value['preview']}
+                self.animations[key] = assets.folder(value['graphics'], 'editor')
+                self.animation_clock.register(self.animations[key])
 
-    def animation_update(self, dt):
-        for value in self.animations.values():
-            value['frame index'] += ANIM_SPEED * dt
+        # largest frame per animation, covers whatever frame was drawn before
+        self.animation_sizes = {key : (max(surf.get_width() for surf in frames), max(surf.get_height() for surf in frames)) for key, frames in self.animations.items()}
 
-            if value['frame index'] >= value['length']:
-                value['frame index'] = 0
+        # preview
+        self.preview_surf = {key : assets.image(value['preview'], 'editor') for key, value in EDITOR_DATA.items() if value['preview']}
 
     def mouse_on_obj(self):
         for sprite in self.canvas_objs:
             if sprite.rect.collidepoint(pg.mouse.get_pos()):
                 return sprite
 
-    def create_grid(self):
-        # add objs to tiles
-        for tile in self.canvas_data.values():
-            tile.objs = []
+    def play_music(self):
+        music.play(EDITOR_MUSIC, 0.4)
 
-        for obj in self.canvas_objs:
-            current_cell = self.get_current_cell(obj)
-            offset = vector(obj.distance_origin) - (vector(current_cell) * TILE_SIZE)
+    def get_obj_cell(self, obj):
+        return floor(obj.distance_origin.x / TILE_SIZE), floor(obj.distance_origin.y / TILE_SIZE)
 
-            if current_cell in self.canvas_data:
-                self.canvas_data[current_cell].add_id(obj.tile_id, offset)
+    def mark_dirty(self, cells):
+        # cells whose exported entries are out of date
+        if self.grid is not None:
+            self.dirty_cells.update(cells)
 
-            else:
-                self.canvas_data[current_cell] = CanvasTile(obj.tile_id, offset)
-
-        # create grid
-        # grid offset
-        left = sorted(self.canvas_data.keys(), key = lambda tile: tile[0])[0][0]
-        top = sorted(self.canvas_data.keys(), key = lambda tile: tile[1])[0][1]
-
-        # empty grid
-        layers = {
-            'water' : {},
-            'bg palms' : {},
-            'terrain' : {},
-            'enemies' : {},
-            'coin' : {},
-            'fg objs' : {},
-        }
-
-        # fill grid
-        for tile_pos, tile in self.canvas_data.items():
-            row_adj = tile_pos[1] - top
-            col_adj = tile_pos[0] - left
-            x = col_adj * TILE_SIZE
-            y = row_adj * TILE_SIZE
+    def export_cell(self, cell):
+        x = (cell[0] - self.grid_origin[0]) * TILE_SIZE
+        y = (cell[1] - self.grid_origin[1]) * TILE_SIZE
 
-            if tile.has_water:
-                layers['water'][(x, y)] = tile.get_water()
+        entries = [('water', (x, y)), ('terrain', (x, y)), ('enemies', (x, y)), ('coin', (x + TILE_SIZE // 2, y + TILE_SIZE // 2))]
 
-            if tile.has_terrain:
-                layers['terrain'][(x, y)] = tile.get_terrain() if tile.get_terrain() in self.land_tiles else 'X'
+        # the grid hash follows every entry that goes out or comes in
+        for layer, pos in entries:
+            if pos in self.grid[layer]:
+                self.grid_sum -= entry_hash(layer, pos, self.grid[layer].pop(pos))
 
-            if tile.coin:
-                layers['coin'][(x + TILE_SIZE // 2, y+ TILE_SIZE // 2)] = tile.coin
+        if cell in self.canvas_data:
+            tile = self.canvas_data[cell]
+            values = (tile.has_water and tile.get_water(), tile.has_terrain and self.land_keys[tile.terrain_mask], tile.enemy, tile.coin)
 
-            if tile.enemy:
-                layers['enemies'][(x, y)] = tile.enemy
+            for (layer, pos), value in zip(entries, values):
+                if value:
+                    self.grid[layer][pos] = value
+                    self.grid_sum += entry_hash(layer, pos, value)
 
-            if tile.objs:
-                for obj, offset in tile.objs:
-                    if obj in [key for key, value in EDITOR_DATA.items() if value['style'] == 'palm_bg']:
-                        layers['bg palms'][(int(x + offset.x), int(y + offset.y))] = obj
+    def create_grid(self):
+        # grid offset, objs count towards the top left corner as well
+        cells = [self.get_obj_cell(obj) for obj in self.canvas_objs]
+        if self.canvas_data:
+            cells.append(self.canvas_data.get_bounds())
+        origin = (min(cell[0] for cell in cells), min(cell[1] for cell in cells))
+
+        # moving the corner shifts every position, the grid starts over
+        if self.grid is None or origin != self.grid_origin:
+            self.grid = {
+                'water' : {},
+                'bg palms' : {},
+                'terrain' : {},
+                'enemies' : {},
+                'coin' : {},
+                'fg objs' : {},
+            }
+            self.grid_origin = origin
+            self.grid_sum = 0
+            self.dirty_cells = set(self.canvas_data.keys())
+
+        # only the cells edited since the last export
+        for cell in self.dirty_cells:
+            self.export_cell(cell)
+        self.dirty_cells = set()
+
+        # objs are few, they are exported fresh every time
+        self.grid['bg palms'] = {}
+        self.grid['fg objs'] = {}
+        for obj in self.canvas_objs:
+            pos = (int(obj.distance_origin.x - origin[0] * TILE_SIZE), int(obj.distance_origin.y - origin[1] * TILE_SIZE))
+            self.grid['bg palms' if obj.tile_id in self.bg_obj_ids else 'fg objs'][pos] = obj.tile_id
 
-                    else:
-                        layers['fg objs'][(int(x + offset.x), int(y + offset.y))] = obj
+        self.export_key = grid_key(self.grid_sum + layer_sum('bg palms', self.grid['bg palms']) + layer_sum('fg objs', self.grid['fg objs']))
 
-        return layers
+        # the level only reads the grid while it is built
+        return self.grid
 
     # input
     def event_loop(self):
@@ -206,17 +245,28 @@ class Editor:
                 sys.exit()
             
             if event.type == pg.KEYDOWN and event.key == pg.K_RETURN:
-                self.switch(self.create_grid())
-                self.editor_music.stop()
+                self.switch(self.create_grid(), self.export_key)
+
+            # everything done while a mouse button is held is one undo step
+            if event.type == pg.MOUSEBUTTONDOWN:
+                self.history.begin()
+
+            # hovering and hotkeys are tracked per rect, everything else repaints the screen
+            if event.type not in (pg.MOUSEMOTION, pg.KEYDOWN, pg.KEYUP):
+                self.full_redraw = True
             
             self.pan_input(event)
             self.selection_hotkeys(event)
+            self.undo_input(event)
+            self.file_input(event)
             self.menu_click(event)
             self.obj_drag(event)
+            self.region_input(event)
             self.canvas_add()
             self.canvas_remove()
 
-            self.create_clouds(event)
+            if event.type == pg.MOUSEBUTTONUP and not any(pg.mouse.get_pressed()):
+                self.history.end()
 
     def pan_input(self, event):
         # middle moust button pressed/released
@@ -258,30 +308,243 @@ class Editor:
             new_idx = self.menu.click(pg.mouse.get_pos(), pg.mouse.get_pressed())
             self.selection_idx = new_idx if new_idx else self.selection_idx
 
+    def undo_input(self, event):
+        if event.type == pg.KEYDOWN and pg.key.get_mods() & pg.KMOD_CTRL:
+            if event.key == pg.K_z and not pg.key.get_mods() & pg.KMOD_SHIFT:
+                self.apply_history(self.history.undo(), undo = True)
+
+            elif event.key in (pg.K_y, pg.K_z):
+                self.apply_history(self.history.redo(), undo = False)
+
+    def file_input(self, event):
+        if event.type == pg.KEYDOWN and pg.key.get_mods() & pg.KMOD_CTRL:
+            if event.key == pg.K_s:
+                self.save()
+
+            if event.key == pg.K_o and os.path.exists(EDITOR_SAVE_FILE):
+                self.load()
+
+            if event.key == pg.K_l and os.path.exists(LEVEL_SAVE_FILE):
+                self.switch(load_grid(LEVEL_SAVE_FILE), file_hash(LEVEL_SAVE_FILE))
+
+    def save(self):
+        tiles = [(cell, code) for cell, tile in self.canvas_data.items() if (code := tile.get_code())]
+        objs = [((int(obj.distance_origin.x), int(obj.distance_origin.y)), obj.tile_id) for obj in self.canvas_objs]
+        save_layers(EDITOR_SAVE_FILE, {'tiles' : tiles, 'objs' : objs})
+        save_grid(LEVEL_SAVE_FILE, self.create_grid())
+
+    def load(self):
+        layers = load_layers(EDITOR_SAVE_FILE)
+
+        # tiles
+        self.canvas_data = CanvasStore()
+        cells, codes = layers['tiles']
+        for cell, code in zip(map(tuple, cells.tolist()), codes.tolist()):
+            self.canvas_data[cell] = CanvasTile()
+            self.canvas_data[cell].set_code(code)
+        self.retile()
+
+        # objs, player and sky handle are moved instead of created
+        fixed = {obj.tile_id : obj for obj in self.canvas_objs if EDITOR_DATA[obj.tile_id]['style'] in ('player', 'sky')}
+        for obj in self.canvas_objs.sprites():
+            if obj.tile_id not in fixed:
+                obj.kill()
+
+        positions, tile_ids = layers['objs']
+        for pos, tile_id in zip(positions.tolist(), tile_ids.tolist()):
+            if tile_id in fixed:
+                obj = fixed[tile_id]
+            else:
+                groups = [self.canvas_objs, self.bg] if EDITOR_DATA[tile_id]['style'] == 'palm_bg' else [self.canvas_objs, self.fg]
+                obj = CanvasObj((0, 0), self.animations[tile_id], tile_id, self.origin, self.animation_clock, groups)
+            obj.distance_origin = vector(pos)
+            obj.pan_pos(self.origin)
+
+        # old steps point at the previous canvas
+        self.history = EditHistory(UNDO_MAX_BYTES, UNDO_MAX_STEPS)
+        self.full_redraw = True
+
+    def get_code(self, cell):
+        return self.canvas_data[cell].get_code() if cell in self.canvas_data else 0
+
+    def set_code(self, cell, code):
+        if not code:
+            if cell in self.canvas_data:
+                del self.canvas_data[cell]
+        else:
+            if cell not in self.canvas_data:
+                self.canvas_data[cell] = CanvasTile()
+            self.canvas_data[cell].set_code(code)
+
+    def apply_history(self, entry, undo):
+        if not entry:
+            return
+
+        tiles, objs, regions = entry
+        records = [tiles[idx : idx + 4] for idx in range(0, len(tiles), 4)]
+        cells = [(col, row) for col, row, before, after in records]
+
+        # undo walks back to the first before state, redo forward to the last after state
+        for col, row, before, after in (reversed(records) if undo else records):
+            self.set_code((col, row), before if undo else after)
+
+        # single cells and regions of one step never overlap, a press either paints or fills
+        for runs, tile_id, erase in (reversed(regions) if undo else regions):
+            for idx in range(0, len(runs), 4):
+                row, left, right, before = runs[idx : idx + 4]
+                code = before if undo else CanvasTile.edit_code(before, tile_id, erase)
+
+                for col in range(left, right + 1):
+                    self.set_code((col, row), code)
+                cells.extend(((left, row), (right, row)))
+                self.mark_dirty((col, row) for col in range(left, right + 1))
+
+        self.mark_dirty(cells)
+
+        for obj, before, after in (reversed(objs) if undo else objs):
+            pos = before if undo else after
+
+            if pos is None:
+                obj.kill()
+            else:
+                if not obj.alive():
+                    obj.add(obj.editor_groups)
+                obj.distance_origin = vector(pos)
+                obj.pan_pos(self.origin)
+
+        if cells:
+            cols = [cell[0] for cell in cells]
+            rows = [cell[1] for cell in cells]
+            self.retile((min(cols) - 1, min(rows) - 1, max(cols) + 1, max(rows) + 1))
+
+        self.full_redraw = True
+
+    def region_input(self, event):
+        valid = EDITOR_DATA[self.selection_idx]['type'] == 'tile' and not self.menu.rect.collidepoint(pg.mouse.get_pos())
+
+        # the region ends with its button, it is only applied when released over the canvas with a tile selected
+        if event.type == pg.MOUSEBUTTONUP and self.region_start and event.button == (3 if self.region_erase else 1):
+            if valid:
+                self.edit_cells(self.get_region_cells(), self.selection_idx, self.region_erase)
+            self.region_start = None
+
+        if not valid:
+            return
+
+        if event.type == pg.MOUSEBUTTONDOWN and event.button in (1, 3) and not self.obj_drag_active:
+            if pg.key.get_mods() & pg.KMOD_SHIFT:
+                self.region_start = self.get_current_cell()
+                self.region_erase = event.button == 3
+
+            elif pg.key.get_mods() & pg.KMOD_CTRL and event.button == 1:
+                self.flood_fill(self.get_current_cell(), self.selection_idx)
+
+    def get_region(self):
+        col, row = self.get_current_cell()
+        return min(col, self.region_start[0]), min(row, self.region_start[1]), max(col, self.region_start[0]), max(row, self.region_start[1])
+
+    def get_region_cells(self):
+        left, top, right, bottom = self.get_region()
+        return [(col, row) for col in range(left, right + 1) for row in range(top, bottom + 1)]
+
+    def get_view_area(self):
+        # cells on screen as (left, top, right, bottom)
+        return floor(-self.origin.x / TILE_SIZE), floor(-self.origin.y / TILE_SIZE), floor((WINDOW_WIDTH - self.origin.x) / TILE_SIZE), floor((WINDOW_HEIGHT - self.origin.y) / TILE_SIZE)
+
+    def get_layer(self, cell, tile_id):
+        # what the cell holds on the layer of tile_id, None when empty
+        return (cell in self.canvas_data and self.canvas_data[cell].get_layer(tile_id)) or None
+
+    def flood_fill(self, start, tile_id):
+        # fills the connected cells that look like the start cell, terrain and water act as walls
+        if self.get_layer(start, tile_id) == CanvasTile.layer_value(tile_id):
+            return
+
+        match_key = lambda cell: (self.get_layer(cell, 2), self.get_layer(cell, 3), self.get_layer(cell, tile_id))
+        target = match_key(start)
+
+        # open space is bounded by the occupied chunks and the view
+        left, top, right, bottom = self.get_view_area()
+        if self.canvas_data:
+            extent = self.canvas_data.get_extent()
+            left, top, right, bottom = min(left, extent[0]), min(top, extent[1]), max(right, extent[2]), max(bottom, extent[3])
+
+        cells = {start}
+        stack = [start]
+        while stack:
+            col, row = stack.pop()
+            for cell in ((col + 1, row), (col - 1, row), (col, row + 1), (col, row - 1)):
+                if cell not in cells and left <= cell[0] <= right and top <= cell[1] <= bottom and match_key(cell) == target:
+                    cells.add(cell)
+                    stack.append(cell)
+
+            if len(cells) > FILL_MAX_CELLS:
+                return
+
+        self.edit_cells(cells, tile_id)
+
+    def edit_cells(self, cells, tile_id, erase = False):
+        # one batch of tile edits, autotiling only runs once over the changed area and its border
+        changed = []
+        befores = []
+        value = CanvasTile.layer_value(tile_id)
+
+        for cell in cells:
+            befores.append(self.get_code(cell))
+
+            if erase:
+                if self.get_layer(cell, tile_id):
+                    self.canvas_data[cell].remove_id(tile_id)
+                    if self.canvas_data[cell].is_empty:
+                        del self.canvas_data[cell]
+                    changed.append(cell)
+
+            elif self.get_layer(cell, tile_id) != value:
+                if cell in self.canvas_data:
+                    self.canvas_data[cell].add_id(tile_id)
+                else:
+                    self.canvas_data[cell] = CanvasTile(tile_id)
+                changed.append(cell)
+
+        if changed:
+            self.history.record_region(cells, befores, tile_id, erase)
+
+        self.mark_dirty(changed)
+
+        if changed and EDITOR_DATA[tile_id]['style'] in ('terrain', 'water'):
+            cols = [cell[0] for cell in changed]
+            rows = [cell[1] for cell in changed]
+            self.retile((min(cols) - 1, min(rows) - 1, max(cols) + 1, max(rows) + 1))
+
+        return changed
+
     def canvas_add(self):
-         if pg.mouse.get_pressed()[0] and not self.menu.rect.collidepoint(pg.mouse.get_pos()) and not self.obj_drag_active:
+         if pg.mouse.get_pressed()[0] and not self.menu.rect.collidepoint(pg.mouse.get_pos()) and not self.obj_drag_active and not self.region_start and not pg.key.get_mods() & pg.KMOD_CTRL:
             current_cell = self.get_current_cell()
 
             if EDITOR_DATA[self.selection_idx]['type'] == 'tile':
             
                 if current_cell != self.last_cell:
+                    before = self.get_code(current_cell)
                     
                     if current_cell in self.canvas_data:
                         self.canvas_data[current_cell].add_id(self.selection_idx)
                     else:
                         self.canvas_data[current_cell] = CanvasTile(self.selection_idx)
             
+                    self.history.record_tile(current_cell, before, self.get_code(current_cell))
                     self.check_neighbors(current_cell)
                     self.last_cell = current_cell
             
             else:
                 if not self.obj_timer.active:
                     groups = [self.canvas_objs, self.bg] if EDITOR_DATA[self.selection_idx]['style'] == 'palm_bg' else [self.canvas_objs, self.fg]
-                    CanvasObj(pg.mouse.get_pos(), self.animations[self.selection_idx]['frames'], self.selection_idx, self.origin, groups)
+                    obj = CanvasObj(pg.mouse.get_pos(), self.animations[self.selection_idx], self.selection_idx, self.origin, self.animation_clock, groups)
+                    self.history.record_obj(obj, None, tuple(obj.distance_origin))
                 self.obj_timer.activate()
 
     def canvas_remove(self):
-        if pg.mouse.get_pressed()[2] and not self.menu.rect.collidepoint(pg.mouse.get_pos()):
+        if pg.mouse.get_pressed()[2] and not self.menu.rect.collidepoint(pg.mouse.get_pos()) and not self.region_start:
 
             # delete obj
             selected_obj = self.mouse_on_obj()
@@ -289,17 +552,20 @@ class Editor:
             if selected_obj:
                 if EDITOR_DATA[selected_obj.tile_id]['style'] not in ('player', 'sky'):
                     selected_obj.kill()
+                    self.history.record_obj(selected_obj, tuple(selected_obj.distance_origin), None)
 
             # delete tiles
             if self.canvas_data:
                 current_cell = self.get_current_cell()
 
                 if current_cell in self.canvas_data:
+                    before = self.get_code(current_cell)
                     self.canvas_data[current_cell].remove_id(self.selection_idx)
 
                     if self.canvas_data[current_cell].is_empty:
                         del self.canvas_data[current_cell]
 
+                    self.history.record_tile(current_cell, before, self.get_code(current_cell))
                     self.check_neighbors(current_cell)
 
     def obj_drag(self, event):
@@ -312,65 +578,62 @@ class Editor:
         if event.type == pg.MOUSEBUTTONUP and self.obj_drag_active:
             for sprite in self.canvas_objs:
                 if sprite.selected:
+                    before = tuple(sprite.distance_origin)
                     sprite.drag_end(self.origin)
+                    self.history.record_obj(sprite, before, tuple(sprite.distance_origin))
                     self.obj_drag_active = False
 
     # drawing
     def draw_grid_lines(self):
-        cols = WINDOW_WIDTH // TILE_SIZE
-        rows = WINDOW_HEIGHT // TILE_SIZE
+        offset = (floor(self.origin.x) % TILE_SIZE - TILE_SIZE, floor(self.origin.y) % TILE_SIZE - TILE_SIZE)
+        self.display_surface.blit(self.support_line_surf, offset)
 
-        offset_vec = vector(x = self.origin.x - int(self.origin.x / TILE_SIZE) * TILE_SIZE, y = self.origin.y - int(self.origin.y / TILE_SIZE) * TILE_SIZE)
+    def get_cells(self, area):
+        # canvas cells that can reach into area, with a cell of margin for enemies taller than a tile
+        left = floor((area.left - self.origin.x) / TILE_SIZE) - 1
+        right = floor((area.right - self.origin.x) / TILE_SIZE) + 1
+        top = floor((area.top - self.origin.y) / TILE_SIZE) - 1
+        bottom = floor((area.bottom - self.origin.y) / TILE_SIZE) + 1
 
-        self.support_line_surf.fill('green')
-
-        for col in range(cols + 1):
-            x = offset_vec.x + (col * TILE_SIZE)
-            pg.draw.line(self.support_line_surf, LINE_COLOR, (x, 0), (x, WINDOW_HEIGHT))
+        return self.canvas_data.get_area(left, top, right, bottom)
 
-        for row in range(rows + 1):
-            y = offset_vec.y + (row * TILE_SIZE)
-            pg.draw.line(self.support_line_surf, LINE_COLOR, (0, y), (WINDOW_WIDTH, y))
-            
-        self.display_surface.blit(self.support_line_surf, (0, 0))
-
-    def draw_level(self):
+    def draw_level(self, area = None):
         self.bg.draw(self.display_surface)
 
-        for cell_pos, tile in self.canvas_data.items():
-            pos = self.origin + vector(cell_pos) * TILE_SIZE
+        # only the chunks on screen are visited
+        for cell_pos, tile in self.get_cells(area or self.display_surface.get_rect()):
+            pos = (self.origin.x + cell_pos[0] * TILE_SIZE, self.origin.y + cell_pos[1] * TILE_SIZE)
 
             if tile.has_terrain:
-                terrain_string = ''.join(tile.terrain_neighbors)
-                terrain_style = terrain_string if terrain_string in self.land_tiles else 'X'
-                self.display_surface.blit(self.land_tiles[terrain_style], pos)
+                self.display_surface.blit(self.land_tiles[self.land_keys[tile.terrain_mask]], pos)
 
             if tile.has_water:
                 if tile.water_top:
                     self.display_surface.blit(self.water_bot, pos)
                 else:
-                    frames = self.animations[3]['frames']
-                    idx = int(self.animations[3]['frame index'])
-                    surf = frames[idx]
+                    surf = self.animation_clock.frame(self.animations[3])
                     self.display_surface.blit(surf, pos)
 
             if tile.coin:
-                frames = self.animations[tile.coin]['frames']
-                idx = int(self.animations[tile.coin]['frame index'])
-                surf = frames[idx]
+                surf = self.animation_clock.frame(self.animations[tile.coin])
                 rect = surf.get_rect(center = (pos[0] + TILE_SIZE // 2, pos[1] + TILE_SIZE // 2))
                 self.display_surface.blit(surf, rect)
 
             if tile.enemy:
-                frames = self.animations[tile.enemy]['frames']
-                idx = int(self.animations[tile.enemy]['frame index'])
-                surf = frames[idx]
+                surf = self.animation_clock.frame(self.animations[tile.enemy])
                 rect = surf.get_rect(midbottom = (pos[0] + TILE_SIZE // 2, pos[1] + TILE_SIZE))
                 self.display_surface.blit(surf, rect)
 
         self.fg.draw(self.display_surface)
 
     def preview(self):
+        if self.region_start:
+            # outline of the region being filled or erased
+            left, top, right, bottom = self.get_region()
+            rect = pg.Rect(self.origin.x + left * TILE_SIZE, self.origin.y + top * TILE_SIZE, (right - left + 1) * TILE_SIZE, (bottom - top + 1) * TILE_SIZE)
+            pg.draw.rect(self.display_surface, 'red' if self.region_erase else 'black', rect, 3)
+            return
+
         selected_obj = self.mouse_on_obj()
         if not self.menu.rect.collidepoint(pg.mouse.get_pos()):
             if selected_obj:
@@ -400,7 +663,7 @@ class Editor:
 
                 self.display_surface.blit(surf, rect)
 
-    def display_sky(self, dt):
+    def display_sky(self):
         self.display_surface.fill(SKY_COLOR)
         
         y = self.sky_handle.rect.centery
@@ -414,7 +677,7 @@ class Editor:
             pg.draw.rect(self.display_surface, HORIZON_TOP_COLOR, horizon_rect2)
             pg.draw.rect(self.display_surface, HORIZON_TOP_COLOR, horizon_rect3)
 
-            self.display_clouds(dt, y)
+            self.clouds.draw(self.display_surface, 0, y)
 
         # sea
         if 0 < y < WINDOW_HEIGHT:
@@ -427,62 +690,137 @@ class Editor:
         pg.draw.line(self.display_surface, HORIZON_COLOR, (0, y), (WINDOW_WIDTH, y), 3)
         
 
-    def display_clouds(self, dt, hy):
-        for cloud in self.current_clouds:
-            cloud['pos'][0] -= cloud['speed'] * dt
-            x = cloud['pos'][0]
-            y = hy - cloud['pos'][1]
-            self.display_surface.blit(cloud['surf'], (x, y))
+    def draw(self, area = None):
+        self.display_sky()
+        self.draw_level(area)
+        self.draw_grid_lines()
+        self.preview()
+        self.menu.display(self.selection_idx)
 
-    def create_clouds(self, event):
-        if event.type == self.cloud_timer:
-            surf = choice(self.cloud_surf)
+    # dirty rects
+    def get_preview_rect(self):
+        # the area preview() draws to
+        if self.menu.rect.collidepoint(pg.mouse.get_pos()):
+            return None
 
-            if randint(0, 4) < 2:
-                surf = pg.transform.scale2x(surf)
-            
-            pos = [WINDOW_WIDTH + randint(50, 100), randint(0, WINDOW_HEIGHT)]
-            speed = randint(20, 50)
+        selected_obj = self.mouse_on_obj()
+        if selected_obj:
+            return selected_obj.rect.inflate(16, 16)
+
+        surf = self.preview_surf[self.selection_idx]
+        if EDITOR_DATA[self.selection_idx]['type'] == 'tile':
+            return surf.get_rect(topleft = self.origin + vector(self.get_current_cell()) * TILE_SIZE)
+        return surf.get_rect(center = pg.mouse.get_pos())
+
+    def get_animated_rects(self):
+        # animated tiles on screen that moved to another frame
+        rects = []
+        if not self.animation_clock.changed:
+            return rects
+
+        for cell_pos, tile in self.get_cells(self.display_surface.get_rect()):
+            pos = (self.origin.x + cell_pos[0] * TILE_SIZE, self.origin.y + cell_pos[1] * TILE_SIZE)
+
+            if tile.has_water and not tile.water_top and self.animation_clock.has_changed(self.animations[3]):
+                rects.append(pg.Rect(pos, (TILE_SIZE, TILE_SIZE)))
+
+            if tile.coin and self.animation_clock.has_changed(self.animations[tile.coin]):
+                rect = pg.Rect((0, 0), self.animation_sizes[tile.coin])
+                rect.center = (pos[0] + TILE_SIZE // 2, pos[1] + TILE_SIZE // 2)
+                rects.append(rect)
 
-            self.current_clouds.append({'surf' : surf, 'pos' : pos, 'speed' : speed})
+            if tile.enemy and self.animation_clock.has_changed(self.animations[tile.enemy]):
+                rect = pg.Rect((0, 0), self.animation_sizes[tile.enemy])
+                rect.midbottom = (pos[0] + TILE_SIZE // 2, pos[1] + TILE_SIZE)
+                rects.append(rect)
 
-            # remove clouds
-            self.current_clouds = [cloud for cloud in self.current_clouds if cloud['pos'][0] > -400]
+        return rects
 
-    def start_clouds(self):
-        for i in range(20):
-            surf = choice(self.cloud_surf)
+    def get_dirty_rects(self):
+        # None means the whole screen has to be redrawn
+        y = self.sky_handle.rect.centery
+        cloud_rects = self.clouds.get_rects(0, y) if y > 0 else {}
+        obj_rects = {obj : obj.rect.copy() for obj in self.canvas_objs}
+        preview = (self.selection_idx, self.get_preview_rect())
+
+        full = self.full_redraw or not EDITOR_DIRTY_RECTS or any(pg.mouse.get_pressed()) or self.origin != self.last_origin
+        rects = []
+
+        if not full:
+            # clouds, old and new position in one rect unless it just respawned
+            for idx in cloud_rects.keys() | self.cloud_rects.keys():
+                old, new = self.cloud_rects.get(idx), cloud_rects.get(idx)
+                if old and new and old.colliderect(new):
+                    rects.append(old.union(new))
+                else:
+                    rects.extend(rect for rect in (old, new) if rect)
+
+            for obj, rect in obj_rects.items():
+                old = self.obj_rects.get(obj)
+                if old != rect or self.animation_clock.has_changed(obj.frames):
+                    rects.append(rect.union(old) if old else rect)
+
+            if preview != self.last_preview:
+                rects.extend(rect for rect in (preview[1], self.last_preview and self.last_preview[1]) if rect)
+
+            if self.selection_idx != self.last_selection:
+                rects.append(self.menu.rect.inflate(8, 8))
 
-            if randint(0, 4) < 2:
-                surf = pg.transform.scale2x(surf)
+            rects.extend(self.get_animated_rects())
 
-            pos = [randint(0, WINDOW_WIDTH), randint(0, WINDOW_HEIGHT)]
-            speed = randint(20, 50)
+        self.full_redraw = False
+        self.last_origin = self.origin.copy()
+        self.last_selection = self.selection_idx
+        self.last_preview = preview
+        self.cloud_rects = cloud_rects
+        self.obj_rects = obj_rects
 
-            self.current_clouds.append({'surf' : surf, 'pos' : pos, 'speed' : speed})
+        if full:
+            return None
+        if not rects:
+            return rects
+
+        # everything is redrawn once inside one merged rect
+        area = rects[0].unionall(rects[1:]).clip(self.display_surface.get_rect())
+        if area.width * area.height > WINDOW_WIDTH * WINDOW_HEIGHT * EDITOR_MAX_DIRTY_AREA:
+            return None
+        return [area]
 
     # update
     def run(self, dt):
         self.event_loop()
 
         # updating
-        self.animation_update(dt)
+        self.animation_clock.update(dt)
         self.canvas_objs.update(dt)
         self.obj_timer.update()
 
+        if self.sky_handle.rect.centery > 0:
+            self.clouds.update(dt)
+
         # drawing
-        self.display_surface.fill('gray')
-        self.display_sky(dt)
-        self.draw_level()
-        self.draw_grid_lines()
-        self.preview()
-        self.menu.display(self.selection_idx)
+        rects = self.get_dirty_rects()
+
+        if rects is None:
+            self.draw()
+        elif rects:
+            self.display_surface.set_clip(rects[0])
+            self.draw(rects[0])
+            self.display_surface.set_clip(None)
+
+        return rects
+
+# style per editor id, looked up once instead of on every edit
+STYLES = {key : value['style'] for key, value in EDITOR_DATA.items()}
 
 class CanvasTile:
-    def __init__(self, tile_id, offset = vector()):
+    # one per painted cell, slots keep it to a handful of references
+    __slots__ = ('has_terrain', 'terrain_mask', 'has_water', 'water_top', 'coin', 'enemy', 'is_empty')
+
+    def __init__(self, tile_id = None):
         # terrain
         self.has_terrain = False
-        self.terrain_neighbors = []
+        self.terrain_mask = 0
 
         # water
         self.has_water = False
@@ -494,26 +832,19 @@ class CanvasTile:
         # enemy
         self.enemy = None
 
-        # objs
-        self.objs = []
-
-        self.add_id(tile_id, offset = offset)
+        if tile_id is not None:
+            self.add_id(tile_id)
         self.is_empty = False
 
-    def add_id(self, tile_id, offset = vector()):
-        options = {key : value['style'] for key, value in EDITOR_DATA.items()}
-        match options[tile_id]:
+    def add_id(self, tile_id):
+        match STYLES[tile_id]:
             case 'terrain' : self.has_terrain = True
             case 'water' : self.has_water = True
             case 'coin' : self.coin = tile_id
             case 'enemy' : self.enemy = tile_id
-            case _ :
-                if (tile_id, offset) not in self.objs: 
-                    self.objs.append((tile_id, offset)) 
 
     def remove_id(self, tile_id):
-        options = {key : value['style'] for key, value in EDITOR_DATA.items()}
-        match options[tile_id]:
+        match STYLES[tile_id]:
             case 'terrain' : self.has_terrain = False
             case 'water' : self.has_water = False
             case 'coin' : self.coin = None
@@ -521,26 +852,60 @@ class CanvasTile:
         
         self.check_content()
 
+    @staticmethod
+    def layer_value(tile_id):
+        # what adding tile_id puts on its layer
+        return True if STYLES[tile_id] in ('terrain', 'water') else tile_id
+
+    @staticmethod
+    def edit_code(code, tile_id, erase):
+        # the code a cell has after tile_id was added or erased
+        tile = CanvasTile()
+        tile.set_code(code)
+        if erase:
+            tile.remove_id(tile_id)
+        else:
+            tile.add_id(tile_id)
+        return tile.get_code()
+
+    def get_layer(self, tile_id):
+        match STYLES[tile_id]:
+            case 'terrain' : return self.has_terrain
+            case 'water' : return self.has_water
+            case 'coin' : return self.coin
+            case 'enemy' : return self.enemy
+
+    def get_code(self):
+        # all tile layers packed into one int for the undo history
+        return self.has_terrain | self.has_water << 1 | (self.coin or 0) << 2 | (self.enemy or 0) << 8
+
+    def set_code(self, code):
+        self.has_terrain = bool(code & 1)
+        self.has_water = bool(code & 2)
+        self.coin = (code >> 2) & 0x3f or None
+        self.enemy = code >> 8 or None
+        self.is_empty = False
+        self.check_content()
+
     def check_content(self):
         if not self.has_terrain and not self.has_water and not self.coin and not self.enemy:
             self.is_empty = True
 
     def get_water(self):
         return 'bottom' if self.water_top else 'top'
-    
-    def get_terrain(self):
-        return ''.join(self.terrain_neighbors)
 
 class CanvasObj(pg.sprite.Sprite):
-    def __init__(self, pos, frames, tile_id, origin, group):
+    def __init__(self, pos, frames, tile_id, origin, clock, group):
         super().__init__(group)
 
         self.tile_id = tile_id
+        self.editor_groups = group
 
         # animation
         self.frames = frames
-        self.frame_idx = 0
-        self.image = self.frames[self.frame_idx]
+        self.clock = clock
+        self.clock.register(frames)
+        self.image = self.clock.frame(self.frames)
         self.rect = self.image.get_rect(center = pos)
 
         # movement
@@ -560,10 +925,8 @@ class CanvasObj(pg.sprite.Sprite):
         self.selected = False
         self.distance_origin = vector(self.rect.topleft) - origin
 
-    def animate(self, dt):
-        self.frame_idx += ANIM_SPEED * dt
-        self.frame_idx = 0 if self.frame_idx >= len(self.frames) else self.frame_idx
-        self.image = self.frames[int(self.frame_idx)]
+    def animate(self):
+        self.image = self.clock.frame(self.frames)
         self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
 
 
@@ -571,5 +934,5 @@ class CanvasObj(pg.sprite.Sprite):
         self.rect.topleft = origin + self.distance_origin
 
     def update(self, dt):
-        self.animate(dt)
+        self.animate()
         self.drag()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import os
+import time
+from random import seed as random_seed
+import pygame as pg
+from settings import *
+from support import *
+from timer import Timer
+from level import Level
+from audio import music
+
+class ScriptedInput:
+    # stands in for pg.key.get_pressed, script maps a frame to the keys held from then on
+    def __init__(self, script = None):
+        self.script = script or {}
+        self.held = set()
+
+    def advance(self, frame):
+        if frame in self.script:
+            self.held = set(self.script[frame])
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key):
+        return key in self.held
+
+class SimClock:
+    # replaces pg.time.get_ticks so timers follow simulated instead of real time
+    def __init__(self):
+        self.ms = 0
+
+    def advance(self, dt):
+        self.ms += dt * 1000
+
+    def ticks(self):
+        return int(self.ms)
+
+def setup_headless():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pg.init()
+
+    # convert_alpha needs a display mode, the dummy driver never shows it
+    if not pg.display.get_surface():
+        pg.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+
+def run_headless(grid, frames, dt = SIM_STEP, script = None, draw = False, seed = None, assets = None, audio = None, streaming = None):
+    setup_headless()
+
+    if seed is not None:
+        random_seed(seed)
+
+    inputs = ScriptedInput(script)
+    clock = SimClock()
+    real_ticks = Timer.get_ticks
+    Timer.get_ticks = staticmethod(clock.ticks)
+
+    try:
+        level = Level(grid, lambda grid = None: None, assets or import_level_assets(), audio or import_level_sounds(), inputs, streaming)
+
+        update_time = 0
+        draw_time = 0
+        start = time.perf_counter()
+
+        for frame in range(frames):
+            inputs.advance(frame)
+            clock.advance(dt)
+
+            step_start = time.perf_counter()
+            level.update(dt)
+            update_time += time.perf_counter() - step_start
+
+            if draw:
+                draw_start = time.perf_counter()
+                level.draw(1)
+                draw_time += time.perf_counter() - draw_start
+
+        wall_time = time.perf_counter() - start
+        music.stop()
+
+    finally:
+        Timer.get_ticks = real_ticks
+
+    return {
+        'frames' : frames,
+        'sim time' : frames * dt,
+        'wall time' : wall_time,
+        'fps' : frames / wall_time if wall_time else 0,
+        'update time' : update_time,
+        'draw time' : draw_time,
+        'player pos' : level.player.rect.topleft,
+        'coins collected' : level.coins_collected,
+        'coins left' : len(level.coin_sprites),
+        'hits' : level.hits,
+        'sprites' : len(level.all_sprites),
+        'awake' : len(level.all_sprites.awake),
+        'pools' : {name : pool.stats() for name, pool in level.pools.items()},
+    }
@@ -0,0 +1,98 @@
+from array import array
+from collections import deque
+
+# rough cost of one object or region record, the sprite itself is shared with the editor
+OBJ_RECORD_BYTES = 96
+REGION_RECORD_BYTES = 96
+
+class EditHistory:
+    # undo/redo stacks of diffs, tiles as packed (col, row, before, after) codes, objects as positions
+    # and region edits as the tile they applied plus runs of equal before codes
+    def __init__(self, max_bytes, max_steps):
+        self.max_bytes = max_bytes
+        self.max_steps = max_steps
+
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0
+
+        # everything recorded between begin and end becomes one step
+        self.entry = None
+
+    @staticmethod
+    def get_size(entry):
+        return entry[0].itemsize * len(entry[0]) + OBJ_RECORD_BYTES * len(entry[1]) + sum(REGION_RECORD_BYTES + runs.itemsize * len(runs) for runs, tile_id, erase in entry[2])
+
+    def begin(self):
+        # returns whether a new step was opened, the caller that opened it ends it
+        if self.entry is None:
+            self.entry = (array('i'), [], [])
+            return True
+        return False
+
+    def end(self):
+        entry, self.entry = self.entry, None
+        if not entry or not (entry[0] or entry[1] or entry[2]):
+            return
+
+        self.undo_stack.append(entry)
+        self.size += self.get_size(entry)
+        self.redo_stack.clear()
+
+        # a step bigger than the whole budget isn't kept, and the steps before it can't be undone past it
+        if self.get_size(entry) > self.max_bytes:
+            self.undo_stack.clear()
+            self.size = 0
+            return
+
+        # oldest steps go first
+        while self.size > self.max_bytes or len(self.undo_stack) > self.max_steps:
+            self.size -= self.get_size(self.undo_stack.popleft())
+
+    def record_tile(self, cell, before, after):
+        if before == after:
+            return
+
+        opened = self.begin()
+        self.entry[0].extend((cell[0], cell[1], before, after))
+        if opened:
+            self.end()
+
+    def record_region(self, cells, befores, tile_id, erase):
+        # tile_id added to or erased from every cell, the after codes follow from the before codes
+        runs = array('i')
+        for (col, row), before in sorted(zip(cells, befores), key = lambda record: (record[0][1], record[0][0])):
+            if runs and runs[-4] == row and runs[-2] == col - 1 and runs[-1] == before:
+                runs[-2] = col
+            else:
+                runs.extend((row, col, col, before))
+
+        opened = self.begin()
+        self.entry[2].append((runs, tile_id, erase))
+        if opened:
+            self.end()
+
+    def record_obj(self, obj, before, after):
+        if before == after:
+            return
+
+        opened = self.begin()
+        self.entry[1].append((obj, before, after))
+        if opened:
+            self.end()
+
+    def undo(self):
+        self.end()
+        if self.undo_stack:
+            entry = self.undo_stack.pop()
+            self.size -= self.get_size(entry)
+            self.redo_stack.append(entry)
+            return entry
+
+    def redo(self):
+        self.end()
+        if self.redo_stack:
+            entry = self.redo_stack.pop()
+            self.undo_stack.append(entry)
+            self.size += self.get_size(entry)
+            return entry
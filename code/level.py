@@ -3,40 +3,61 @@ from pygame.math import Vector2 as vector
 import sys
 from settings import *
 from support import *
-from sprites import Generic, Block, Animated, Particle, Coin, Player, Spikes, Tooth, Shell, Cloud
-from random import choice, randint
+from spatial import SpatialGroup
+from chunks import TerrainChunks, chunk_key, chunk_range
+from streaming import LevelStreamer
+from levelcache import load_level
+from sprites import Block, Animated, Particle, Coin, Player, Spikes, Tooth, Shell, Pearl
+from animation import AnimationClock
+from pool import SpritePool
+from clouds import CloudField
+from audio import music
 
 class Level:
-    def __init__(self, grid, switch, asset_dict, audio):
+    def __init__(self, grid, switch, asset_dict, audio, get_keys = pg.key.get_pressed, streaming = None, grid_key = None):
         self.display_surface = pg.display.get_surface()
         self.switch = switch
+        self.get_keys = get_keys
 
         # groups
         self.all_sprites = CameraGroup()
-        self.coin_sprites = pg.sprite.Group()
-        self.damage_sprites = pg.sprite.Group()
-        self.collision_sprites = pg.sprite.Group()
+        self.coin_sprites = SpatialGroup()
+        self.damage_sprites = SpatialGroup()
+        self.collision_sprites = SpatialGroup()
         self.shell_sprites = pg.sprite.Group()
 
-        self.build_level(grid, asset_dict, audio['jump'])
+        # animation
+        self.animation_clock = AnimationClock()
+
+        # short lived sprites
+        self.pools = {
+            'pearl' : SpritePool(Pearl),
+            'particle' : SpritePool(Particle),
+        }
+
+        compiled = load_level(grid, grid_key)
+        self.build_level(grid, compiled, asset_dict, audio['jump'], streaming)
 
         # level limits
         self.level_limits = {
             'left' : -WINDOW_WIDTH,
-            'right' : sorted(list(grid['terrain'].keys()), key = lambda pos: pos[0])[-1][0] + 500
+            'right' : compiled['right']
         }
 
         # support
         self.particle_surf = asset_dict['particle']
-        self.cloud_surf = asset_dict['clouds']
-        self.cloud_timer = pg.USEREVENT + 2
-        pg.time.set_timer(self.cloud_timer, 2000)
-        self.start_clouds()
+
+        # clouds, recycled from the right instead of spawned, about one every 400px
+        left, right = self.level_limits['left'], self.level_limits['right']
+        self.clouds = CloudField(asset_dict['clouds'], max(20, (right - left) // 400), (left, right), (right + 100, right + 300), left, (-50, 600), (20, 30), 1 / 3)
+        self.all_sprites.clouds = self.clouds
+
+        # stats
+        self.coins_collected = 0
+        self.hits = 0
 
         # sounds
-        self.bg_music = audio['music']
-        self.bg_music.set_volume(0.3)
-        self.bg_music.play(loops = -1)
+        music.play(LEVEL_MUSIC, 0.3)
 
         self.coin_sound = audio['coin']
         self.coin_sound.set_volume(0.3)
@@ -44,72 +65,117 @@ class Level:
         self.hit_sound = audio['hit']
         self.hit_sound.set_volume(0.3)
 
-    def build_level(self, grid, asset_dict, jump_sound):
-        for layer_name, layer in grid.items():
-            for pos, data in layer.items():
-                if layer_name == 'terrain':
-                    Generic(pos, asset_dict['land'][data], [self.all_sprites, self.collision_sprites])
-
-                if layer_name == 'water' :
-                    if data == 'top' :
-                       Animated(asset_dict['water top'], pos, self.all_sprites, LEVEL_LAYERS['water'])
-                       pass
-                    else:
-                        Generic(pos, asset_dict['water bottom'], self.all_sprites, LEVEL_LAYERS['water'])
-
-                match data:
-                    case 0 : self.player = Player(pos, asset_dict['player'], self.all_sprites, self.collision_sprites, jump_sound)
-
-                    case 1:
-                        self.horizon_y = pos[1]
-                        self.all_sprites.horizon_y = pos[1]
-
-                    case 4 : Coin('gold', asset_dict['gold'], pos, [self.all_sprites, self.coin_sprites]) 
-                    case 5 : Coin('silver', asset_dict['silver'], pos, [self.all_sprites, self.coin_sprites])
-                    case 6 : Coin('diamond', asset_dict['diamond'], pos, [self.all_sprites, self.coin_sprites])
-
-                    case 7 : Spikes(asset_dict['spikes'], pos, [self.all_sprites, self.damage_sprites]) 
-                    case 8 : 
-                        Tooth(asset_dict['tooth'], pos, [self.all_sprites, self.damage_sprites], self.collision_sprites)
-                    case 9 : 
-                        Shell('left', asset_dict['shell'], pos, [self.all_sprites, self.collision_sprites, self.shell_sprites], asset_dict['pearl'], self.damage_sprites)
-                    case 10 : 
-                        Shell('right', asset_dict['shell'], pos, [self.all_sprites, self.collision_sprites, self.shell_sprites], asset_dict['pearl'], self.damage_sprites)
-
-                    case 11 : 
-                        Animated(asset_dict['palms']['small_fg'], pos, self.all_sprites)
-                        Block(pos, (76, 50), self.collision_sprites)
-                    case 12 : 
-                        Animated(asset_dict['palms']['large_fg'], pos, self.all_sprites)
-                        Block(pos, (76, 50), self.collision_sprites)
-                    case 13 : 
-                        Animated(asset_dict['palms']['left_fg'], pos, self.all_sprites)
-                        Block(pos, (76, 50), self.collision_sprites)
-                    case 14 : 
-                        Animated(asset_dict['palms']['right_fg'], pos, self.all_sprites)
-                        Block(pos + vector(50, 0), (76, 50), self.collision_sprites)
-
-                    case 15 : Animated(asset_dict['palms']['small_bg'], pos, self.all_sprites, LEVEL_LAYERS['bg'])
-                    case 16 : Animated(asset_dict['palms']['large_bg'], pos, self.all_sprites, LEVEL_LAYERS['bg'])
-                    case 17 : Animated(asset_dict['palms']['left_bg'], pos, self.all_sprites, LEVEL_LAYERS['bg'])
-                    case 18 : Animated(asset_dict['palms']['right_bg'], pos, self.all_sprites, LEVEL_LAYERS['bg'])
-
-        for sprite in self.shell_sprites:
-            sprite.player = self.player
+    def build_level(self, grid, compiled, asset_dict, jump_sound, streaming):
+        self.asset_dict = asset_dict
+        self.jump_sound = jump_sound
+
+        # player and sky first, everything else is spawned per chunk
+        for pos, data in grid['fg objs'].items():
+            match data:
+                case 0 : self.player = Player(pos, asset_dict['player'], self.all_sprites, self.collision_sprites, jump_sound, self.get_keys)
+
+                case 1:
+                    self.horizon_y = pos[1]
+                    self.all_sprites.horizon_y = pos[1]
+
+        self.all_sprites.follow(self.player)
+
+        # static tiles
+        self.terrain = TerrainChunks(LEVEL_LAYERS['main'])
+        self.water_bottom = TerrainChunks(LEVEL_LAYERS['water'])
+        self.all_sprites.add_chunks(self.terrain)
+        self.all_sprites.add_chunks(self.water_bottom)
+
+        if streaming is None:
+            streaming = len(grid['terrain']) >= STREAMING_MIN_TILES
+
+        self.streamer = LevelStreamer(self, compiled, streaming)
+
+        if streaming:
+            self.streamer.update(self.all_sprites.get_camera())
+        else:
+            self.streamer.load_all()
+
+    def spawn(self, layer_name, pos, data):
+        asset_dict = self.asset_dict
+
+        if layer_name == 'water':
+            return [Animated(asset_dict['water top'], pos, self.all_sprites, self.animation_clock, LEVEL_LAYERS['water'])]
+
+        match data:
+            case 4 : return [Coin('gold', asset_dict['gold'], pos, [self.all_sprites, self.coin_sprites], self.animation_clock)]
+            case 5 : return [Coin('silver', asset_dict['silver'], pos, [self.all_sprites, self.coin_sprites], self.animation_clock)]
+            case 6 : return [Coin('diamond', asset_dict['diamond'], pos, [self.all_sprites, self.coin_sprites], self.animation_clock)]
+
+            case 7 : return [Spikes(asset_dict['spikes'], pos, [self.all_sprites, self.damage_sprites])]
+            case 8 : 
+                return [Tooth(asset_dict['tooth'], pos, [self.all_sprites, self.damage_sprites], self.collision_sprites)]
+            case 9 : 
+                shell = Shell('left', asset_dict['shell'], pos, [self.all_sprites, self.collision_sprites, self.shell_sprites], asset_dict['pearl'], self.damage_sprites, self.pools['pearl'])
+                shell.player = self.player
+                return [shell]
+            case 10 : 
+                shell = Shell('right', asset_dict['shell'], pos, [self.all_sprites, self.collision_sprites, self.shell_sprites], asset_dict['pearl'], self.damage_sprites, self.pools['pearl'])
+                shell.player = self.player
+                return [shell]
+
+            case 11 : 
+                return [Animated(asset_dict['palms']['small_fg'], pos, self.all_sprites, self.animation_clock),
+                        Block(pos, (76, 50), self.collision_sprites)]
+            case 12 : 
+                return [Animated(asset_dict['palms']['large_fg'], pos, self.all_sprites, self.animation_clock),
+                        Block(pos, (76, 50), self.collision_sprites)]
+            case 13 : 
+                return [Animated(asset_dict['palms']['left_fg'], pos, self.all_sprites, self.animation_clock),
+                        Block(pos, (76, 50), self.collision_sprites)]
+            case 14 : 
+                return [Animated(asset_dict['palms']['right_fg'], pos, self.all_sprites, self.animation_clock),
+                        Block(pos + vector(50, 0), (76, 50), self.collision_sprites)]
+
+            case 15 : return [Animated(asset_dict['palms']['small_bg'], pos, self.all_sprites, self.animation_clock, LEVEL_LAYERS['bg'])]
+            case 16 : return [Animated(asset_dict['palms']['large_bg'], pos, self.all_sprites, self.animation_clock, LEVEL_LAYERS['bg'])]
+            case 17 : return [Animated(asset_dict['palms']['left_bg'], pos, self.all_sprites, self.animation_clock, LEVEL_LAYERS['bg'])]
+            case 18 : return [Animated(asset_dict['palms']['right_bg'], pos, self.all_sprites, self.animation_clock, LEVEL_LAYERS['bg'])]
+
+        return []
+
+    def bake_chunk(self, key, terrain_tiles, water_tiles, block_rects):
+        blocks = []
+
+        if terrain_tiles:
+            self.terrain.bake(key, [(pos, self.asset_dict['land'][data]) for pos, data in terrain_tiles])
+            blocks = [Block((x, y), (width, height), self.collision_sprites) for x, y, width, height in block_rects]
+
+        if water_tiles:
+            self.water_bottom.bake(key, [(pos, self.asset_dict['water bottom']) for pos, data in water_tiles])
+
+        return blocks
+
+    def evict_chunk(self, key, blocks):
+        self.terrain.evict(key)
+        self.water_bottom.evict(key)
+
+        for block in blocks:
+            block.kill()
 
     def get_coins(self):
-        collided_coins = pg.sprite.spritecollide(self.player, self.coin_sprites, True)
+        collided_coins = self.coin_sprites.collide(self.player.rect)
 
         for sprite in collided_coins:
+            sprite.kill()
+            self.streamer.remove(sprite)
+            self.coins_collected += 1
             self.coin_sound.play()
-            Particle(self.particle_surf, sprite.rect.center, self.all_sprites)
+            self.pools['particle'].acquire(self.particle_surf, sprite.rect.center, self.all_sprites)
 
     def get_damage(self):
-        collision_sprites = pg.sprite.spritecollide(self.player, self.damage_sprites, False, pg.sprite.collide_mask)
+        collision_sprites = [sprite for sprite in self.damage_sprites.collide(self.player.rect) if pg.sprite.collide_mask(self.player, sprite)]
 
         if collision_sprites:
             self.hit_sound.play()
-            self.player.damage()
+
+            if self.player.damage():
+                self.hits += 1
 
     def event_loop(self):
         for event in pg.event.get():
@@ -119,33 +185,21 @@ class Level:
 
             if event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
                 self.switch()
-                self.bg_music.stop()
-
-            if event.type == self.cloud_timer:
-                surf = choice(self.cloud_surf)
-                surf = pg.transform.scale2x(surf) if randint(0, 5) > 3 else surf
-                x = self.level_limits['right'] + randint(100, 300)
-                y = self.horizon_y - randint(-50, 600)
-                Cloud((x, y), surf, self.all_sprites, self.level_limits['left'])
-            
-    def start_clouds(self):
-        for cloud in range(20):
-            surf = choice(self.cloud_surf)
-            surf = pg.transform.scale2x(surf) if randint(0, 5) > 3 else surf
-            x = randint(self.level_limits['left'], self.level_limits['right'])
-            y = self.horizon_y - randint(-50, 600)
-            Cloud((x, y), surf, self.all_sprites, self.level_limits['left'])
-
-    def run(self, dt):
-        #update
-        self.event_loop()
-        self.display_surface.fill(SKY_COLOR)
+
+    def update(self, dt):
+        # one fixed simulation step
+        self.clouds.update(dt)
+        self.animation_clock.update(dt)
         self.get_coins()
         self.get_damage()
-
-        #drawing
+        self.all_sprites.follow(self.player)
+        self.streamer.update(self.all_sprites.get_camera())
         self.all_sprites.update(dt)
-        self.all_sprites.custom_draw(self.player)
+
+    def draw(self, alpha):
+        # alpha is how far the frame is between the last two simulation steps
+        self.display_surface.fill(SKY_COLOR)
+        self.all_sprites.custom_draw(self.player, alpha)
 
 class CameraGroup(pg.sprite.Group):
     def __init__(self):
@@ -154,6 +208,98 @@ class CameraGroup(pg.sprite.Group):
         self.display_surface = pg.display.get_surface()
         self.offset = vector()
 
+        # per layer buckets of awake sprites, kept in insertion order for a stable draw order
+        self.layers = {z : {} for z in sorted(LEVEL_LAYERS.values())}
+        self.unsorted = set()
+        self.order = {}
+        self.count = 0
+
+        # activation, only awake sprites are updated and drawn
+        self.awake = {}
+        self.sleeping = {}
+        self.sleep_cells = {}
+
+        # baked static tiles, drawn underneath the sprites of the same layer
+        self.chunks = {}
+        self.clouds = None
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite, layer)
+
+        self.order[sprite] = self.count
+        self.count += 1
+        self.awake[sprite] = None
+        self.layers[sprite.z][sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        del self.order[sprite]
+
+        if sprite in self.sleep_cells:
+            del self.sleeping[self.sleep_cells.pop(sprite)][sprite]
+        else:
+            del self.awake[sprite]
+            del self.layers[sprite.z][sprite]
+
+    def sleep(self, sprite):
+        del self.awake[sprite]
+        del self.layers[sprite.z][sprite]
+
+        cell = chunk_key(sprite.rect.center)
+        self.sleeping.setdefault(cell, {})[sprite] = None
+        self.sleep_cells[sprite] = cell
+
+    def wake(self, sprite):
+        del self.sleeping[self.sleep_cells.pop(sprite)][sprite]
+
+        self.awake[sprite] = None
+        self.layers[sprite.z][sprite] = None
+        self.unsorted.add(sprite.z)
+
+    def get_camera(self):
+        return pg.Rect(self.offset, (WINDOW_WIDTH, WINDOW_HEIGHT))
+
+    def update_activation(self):
+        camera = self.get_camera()
+
+        # sleeping sprites don't move, so only the cells around the camera need a look
+        wake_area = camera.inflate(WAKE_DISTANCE * 2, WAKE_DISTANCE * 2)
+        for cell in chunk_range(wake_area):
+            for sprite in list(self.sleeping.get(cell, ())):
+                if wake_area.colliderect(sprite.rect):
+                    self.wake(sprite)
+
+        # pooled sprites are handed back instead of sleeping
+        sleep_area = camera.inflate(SLEEP_DISTANCE * 2, SLEEP_DISTANCE * 2)
+        for sprite in list(self.awake):
+            if not sprite.always_active and not sleep_area.colliderect(sprite.rect):
+                if sprite.pool:
+                    sprite.release()
+                else:
+                    self.sleep(sprite)
+
+    def update(self, dt):
+        self.update_activation()
+
+        for sprite in list(self.awake):
+            sprite.update(dt)
+
+    def render_pos(self, sprite, alpha):
+        if sprite.old_rect:
+            x = sprite.old_rect.x + (sprite.rect.x - sprite.old_rect.x) * alpha
+            y = sprite.old_rect.y + (sprite.rect.y - sprite.old_rect.y) * alpha
+            return round(x), round(y)
+
+        return sprite.rect.topleft
+
+    def follow(self, target, alpha = 1):
+        x, y = self.render_pos(target, alpha)
+        self.offset.x = x + target.rect.width // 2 - (WINDOW_WIDTH / 2)
+        self.offset.y = y + target.rect.height // 2 - (WINDOW_HEIGHT / 2)
+
+    def add_chunks(self, chunks):
+        self.chunks[chunks.z] = chunks
+
     def draw_horizon(self):
         horizon_pos = self.horizon_y - self.offset.y
 
@@ -172,21 +318,37 @@ class CameraGroup(pg.sprite.Group):
         if horizon_pos < 0:
             self.display_surface.fill(SEA_COLOR)
 
-    def custom_draw(self, player):
-        self.offset.x = player.rect.centerx - (WINDOW_WIDTH / 2)
-        self.offset.y = player.rect.centery - (WINDOW_HEIGHT / 2)
+    def draw_layer(self, z, view, alpha):
+        offset_x = int(self.offset.x)
+        offset_y = int(self.offset.y)
+
+        if z in self.chunks:
+            self.chunks[z].draw(self.display_surface, view, (offset_x, offset_y))
+
+        # woken sprites were appended at the end of their bucket
+        if z in self.unsorted:
+            self.layers[z] = dict.fromkeys(sorted(self.layers[z], key = self.order.get))
+            self.unsorted.discard(z)
+
+        blit_list = []
+        for sprite in self.layers[z]:
+            if view.colliderect(sprite.rect):
+                x, y = self.render_pos(sprite, alpha)
+                blit_list.append((sprite.image, (x - offset_x, y - offset_y)))
+
+        self.display_surface.blits(blit_list, doreturn = False)
+
+    def custom_draw(self, player, alpha = 1):
+        self.follow(player, alpha)
+
+        # culling area
+        view = pg.Rect(self.offset.x, self.offset.y, WINDOW_WIDTH, WINDOW_HEIGHT).inflate(DRAW_MARGIN * 2, DRAW_MARGIN * 2)
 
-        for sprite in self:
-            if sprite.z == LEVEL_LAYERS['clouds']:
-                offset_rect = sprite.rect.copy()
-                offset_rect.center -= self.offset
-                self.display_surface.blit(sprite.image, offset_rect)
+        if self.clouds:
+            self.clouds.draw(self.display_surface, self.offset.x, self.horizon_y - self.offset.y)
 
         self.draw_horizon()
 
-        for sprite in self:
-            for layer in LEVEL_LAYERS.values():
-                if sprite.z == layer and sprite.z != LEVEL_LAYERS['clouds']:
-                    offset_rect = sprite.rect.copy()
-                    offset_rect.center -= self.offset
-                    self.display_surface.blit(sprite.image, offset_rect)
\ No newline at end of file
+        for z in self.layers:
+            if z != LEVEL_LAYERS['clouds']:
+                self.draw_layer(z, view, alpha)
\ No newline at end of file
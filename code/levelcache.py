@@ -0,0 +1,104 @@
+import os
+import pickle
+import hashlib
+from zlib import crc32
+from settings import *
+from chunks import chunk_key, merge_runs
+
+# bump when the compiled layout changes so old files are never read
+CACHE_VERSION = 2
+
+MASK = (1 << 64) - 1
+VALUE_CODES = {}
+
+def entry_hash(layer_name, pos, data):
+    # stable 64 bit hash of one grid entry, a grid hashes to the sum of its entries so edits can add and subtract
+    key = (layer_name, data)
+    if key not in VALUE_CODES:
+        VALUE_CODES[key] = crc32(f'{layer_name} {data}'.encode())
+
+    value = (pos[0] * 0x9E3779B97F4A7C15 + pos[1] * 0xC2B2AE3D27D4EB4F + VALUE_CODES[key] * 0x165667B19E3779F9) & MASK
+    value = ((value ^ value >> 29) * 0xBF58476D1CE4E5B9) & MASK
+    return value ^ value >> 32
+
+def layer_sum(layer_name, layer):
+    return sum(entry_hash(layer_name, pos, data) for pos, data in layer.items())
+
+def grid_key(total):
+    return f'grid-{CACHE_VERSION}-{TILE_SIZE}-{CHUNK_SIZE}-{total & MASK:016x}'
+
+def grid_hash(grid):
+    # for grids that don't come with a key, the editor keeps its sum up to date while exporting
+    return grid_key(sum(layer_sum(layer_name, layer) for layer_name, layer in grid.items()))
+
+def file_hash(path):
+    # saved grids are keyed by their bytes, hashing the file is cheaper than walking the grid
+    with open(path, 'rb') as file:
+        return f'file-{CACHE_VERSION}-{TILE_SIZE}-{CHUNK_SIZE}-{hashlib.sha1(file.read()).hexdigest()}'
+
+def compile_level(grid):
+    # everything the level prepares from the grid before sprites exist
+    terrain = {}
+    water = {}
+    entities = {}
+
+    for pos, data in grid['terrain'].items():
+        terrain.setdefault(chunk_key(pos), []).append((pos, data))
+
+    for layer_name, layer in grid.items():
+        if layer_name == 'terrain':
+            continue
+
+        for pos, data in layer.items():
+            if layer_name == 'water' and data == 'bottom':
+                water.setdefault(chunk_key(pos), []).append((pos, data))
+            elif data not in (0, 1):
+                entities.setdefault(chunk_key(pos), []).append((layer_name, pos, data))
+
+    # sorted so the result only depends on the content, not on the export order
+    for buckets in (terrain, water, entities):
+        for bucket in buckets.values():
+            bucket.sort()
+
+    # collision layout, merged runs per terrain chunk
+    blocks = {key : [tuple(rect) for rect in merge_runs([pos for pos, data in tiles])] for key, tiles in terrain.items()}
+
+    return {
+        'terrain' : terrain,
+        'water' : water,
+        'entities' : entities,
+        'blocks' : blocks,
+        'right' : max(pos[0] for pos in grid['terrain']) + 500,
+    }
+
+# the last compiled level, going back and forth between editor and level doesn't touch the disk
+last_compiled = {}
+
+def load_level(grid, key = None):
+    # compiled level from memory or the disk cache, compiled and stored on a miss
+    key = key or grid_hash(grid)
+    if key in last_compiled:
+        return last_compiled[key]
+
+    path = os.path.join(LEVEL_CACHE_DIR, f'{key}.level') if LEVEL_CACHE_DIR else None
+    if path and os.path.exists(path):
+        os.utime(path)
+        with open(path, 'rb') as file:
+            compiled = pickle.load(file)
+
+    else:
+        compiled = compile_level(grid)
+
+        if path:
+            os.makedirs(LEVEL_CACHE_DIR, exist_ok = True)
+            with open(path, 'wb') as file:
+                pickle.dump(compiled, file, pickle.HIGHEST_PROTOCOL)
+
+            # only the most recent levels are kept
+            files = sorted((entry for entry in os.scandir(LEVEL_CACHE_DIR) if entry.name.endswith('.level')), key = lambda entry: entry.stat().st_mtime)
+            for entry in files[:-LEVEL_CACHE_FILES]:
+                os.remove(entry.path)
+
+    last_compiled.clear()
+    last_compiled[key] = compiled
+    return compiled
@@ -0,0 +1,135 @@
+import os
+import mmap
+import struct
+import numpy as np
+
+# file: magic, version, layer count, then per layer a header followed by its arrays
+# layer header: name, value kind and dtype, layout, cell count, string table size, grid left/top/cols/rows/step
+MAGIC = b'PLVL'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sHH')
+LAYER_HEADER = struct.Struct('<16sBBBxIIiiIII')
+
+INT_VALUES, STR_VALUES = 0, 1
+DTYPES = [np.dtype(np.uint8), np.dtype(np.uint16), np.dtype(np.int32)]
+
+# positions are either listed or, when they sit on a grid and that is smaller, a bitmap over the grid
+LISTED, BITMAP = 0, 1
+
+def pad(size):
+    # arrays start on 4 byte boundaries
+    return -size % 4
+
+def get_dtype(values):
+    if not values.size or (values.min() >= 0 and values.max() < 256):
+        return 0
+    if values.min() >= 0 and values.max() < 65536:
+        return 1
+    return 2
+
+def get_grid(positions):
+    # left, top, cols, rows, step and cell index of the smallest grid holding every position once,
+    # None if there is none or the bitmap would be bigger than the list
+    if not len(positions):
+        return None
+
+    left, top = positions.min(axis = 0).tolist()
+    offsets = positions - (left, top)
+    step = int(np.gcd.reduce(offsets.ravel())) or 1
+    cols, rows = (offsets.max(axis = 0) // step + 1).tolist()
+
+    if cols * rows // 8 >= positions.nbytes:
+        return None
+
+    cell_idx = offsets[:, 1] // step * cols + offsets[:, 0] // step
+    if np.unique(cell_idx).size < cell_idx.size:
+        return None
+    return left, top, cols, rows, step, cell_idx
+
+def save_layers(path, layers):
+    # layers maps a name to a dict or list of ((x, y), value), values are all ints or all strings
+    os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+
+    with open(path, 'wb') as file:
+        file.write(FILE_HEADER.pack(MAGIC, VERSION, len(layers)))
+
+        for name, layer in layers.items():
+            items = list(layer.items() if hasattr(layer, 'items') else layer)
+            positions = np.array([pos for pos, value in items], dtype = np.int32).reshape(-1, 2)
+            values = [value for pos, value in items]
+
+            # strings are stored once in a table, cells hold their index
+            table_bytes = b''
+            kind = INT_VALUES
+            if values and isinstance(values[0], str):
+                table = sorted(set(values))
+                lookup = {value : idx for idx, value in enumerate(table)}
+                table_bytes = '\0'.join(table).encode()
+                values = [lookup[value] for value in values]
+                kind = STR_VALUES
+
+            values = np.array(values, dtype = np.int64)
+            dtype = get_dtype(values)
+
+            grid = get_grid(positions)
+            if grid:
+                left, top, cols, rows, step, cell_idx = grid
+                order = np.argsort(cell_idx, kind = 'stable')
+
+                bits = np.zeros(cols * rows, dtype = bool)
+                bits[cell_idx] = True
+                position_bytes = np.packbits(bits).tobytes()
+                values = values[order]
+            else:
+                left, top, cols, rows, step = 0, 0, 0, 0, 0
+                position_bytes = positions.tobytes()
+
+            value_bytes = values.astype(DTYPES[dtype]).tobytes()
+
+            file.write(LAYER_HEADER.pack(name.encode(), kind, dtype, BITMAP if grid else LISTED, len(items), len(table_bytes), left, top, cols, rows, step))
+            for data in (table_bytes, position_bytes, value_bytes):
+                file.write(data + bytes(pad(len(data))))
+
+def load_layers(path):
+    # name -> (positions as an (n, 2) array, values as an array), read straight from the mapped file
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    magic, version, count = FILE_HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not a level file')
+
+    layers = {}
+    offset = FILE_HEADER.size
+    for _ in range(count):
+        name, kind, dtype, layout, cells, table_size, left, top, cols, rows, step = LAYER_HEADER.unpack_from(buffer, offset)
+        offset += LAYER_HEADER.size
+
+        table = buffer[offset : offset + table_size].decode().split('\0')
+        offset += table_size + pad(table_size)
+
+        if layout == BITMAP:
+            size = (cols * rows + 7) // 8
+            cell_idx = np.flatnonzero(np.unpackbits(np.frombuffer(buffer, np.uint8, size, offset), count = cols * rows))
+            positions = np.stack((left + cell_idx % cols * step, top + cell_idx // cols * step), axis = 1)
+        else:
+            size = cells * 8
+            positions = np.frombuffer(buffer, np.int32, cells * 2, offset).reshape(-1, 2)
+        offset += size + pad(size)
+
+        values = np.frombuffer(buffer, DTYPES[dtype], cells, offset)
+        offset += values.nbytes + pad(values.nbytes)
+
+        if kind == STR_VALUES:
+            values = np.array(table, dtype = object)[values]
+
+        layers[name.rstrip(b'\0').decode()] = (positions, values)
+
+    return layers
+
+def save_grid(path, grid):
+    save_layers(path, grid)
+
+def load_grid(path):
+    # back to the dict of dicts create_grid makes
+    return {name : dict(zip(map(tuple, positions.tolist()), values.tolist())) for name, (positions, values) in load_layers(path).items()}
@@ -1,101 +1,86 @@
 import pygame as pg
-from pygame.image import load
 from pygame.math import Vector2 as vector
-from os import walk
 import sys
 from settings import *
 from editor import Editor
 from support import *
 from level import Level
+from assets import assets
+from audio import music
 
 class Main:
     def __init__(self):
         pg.init()
         self.display_surface = pg.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         self.clock = pg.time.Clock()
+        self.accumulator = 0
         self.imports()
 
         self.editor_active = True
         self.trans = Transition(self.toggle)
         self.editor = Editor(self.land_tiles, self.switch)
 
+        if ASSET_STATS:
+            for group, stats in assets.report().items():
+                print(f"{group}: {stats['files']} files, {stats['time'] * 1000:.0f} ms, {stats['bytes'] / 1024:.0f} KiB")
+
         # cursor
-        surf = load('../graphics/cursors/mouse.png').convert_alpha()
+        surf = assets.image('../graphics/cursors/mouse.png')
         cursor = pg.cursors.Cursor((0, 0), surf)
         pg.mouse.set_cursor(cursor)
 
     def imports(self):
-        self.land_tiles = import_folder_dict('../graphics/terrain/land')
-        self.water_bottom = load('../graphics/terrain/water/water_bottom.png').convert_alpha()
-        self.water_top_anim = import_folder('../graphics/terrain/water/animation')
-        
-        # coins
-        self.gold = import_folder('../graphics/items/gold')
-        self.silver = import_folder('../graphics/items/silver')
-        self.diamond = import_folder('../graphics/items/diamond')
-        self.particle = import_folder('../graphics/items/particle')
-
-        # trees
-        self.palms = {folder : import_folder(f'../graphics/terrain/palm/{folder}') for folder in list(walk('../graphics/terrain/palm'))[0][1]}
-
-        # enemies
-        self.spikes = load('../graphics/enemies/spikes/spikes.png').convert_alpha()
-        self.tooth = {folder : import_folder(f'../graphics/enemies/tooth/{folder}') for folder in list(walk('../graphics/enemies/tooth'))[0][1]}
-        self.shell = {folder : import_folder(f'../graphics/enemies/shell_left/{folder}') for folder in list(walk('../graphics/enemies/shell_left'))[0][1]}
-        self.pearl = load('../graphics/enemies/pearl/pearl.png').convert_alpha()
-
-        # player
-        self.player_graphics = {folder : import_folder(f'../graphics/player/{folder}') for folder in list(walk('../graphics/player'))[0][1]}
-
-        # clouds
-        self.clouds = import_folder('../graphics/clouds')
-
-        # sounds
-        self.level_sounds = {
-            'coin' : pg.mixer.Sound('../audio/coin.wav'),
-            'hit' : pg.mixer.Sound('../audio/hit.wav'),
-            'jump' : pg.mixer.Sound('../audio/jump.wav'),
-            'music' : pg.mixer.Sound('../audio/SuperHero.ogg'),
-        }
+        self.level_assets = import_level_assets()
+        self.land_tiles = self.level_assets['land']
+        self.level_sounds = import_level_sounds()
 
     def toggle(self):
         self.editor_active = not self.editor_active
 
         if self.editor_active:
-            self.editor.editor_music.play()
+            self.editor.play_music()
 
-    def switch(self, grid = None):
+    def switch(self, grid = None, grid_key = None):
         self.trans.active = True
 
         if grid:
-            self.level = Level(grid, self.switch, {
-                    'land' : self.land_tiles,
-                    'water bottom' : self.water_bottom,
-                    'water top' : self.water_top_anim, 
-                    'gold' : self.gold,
-                    'silver' : self.silver,
-                    'diamond' : self.diamond,
-                    'particle' : self.particle,
-                    'palms' : self.palms,
-                    'spikes' : self.spikes,
-                    'tooth' : self.tooth,
-                    'shell' : self.shell,
-                    'player' : self.player_graphics,
-                    'pearl' : self.pearl,
-                    'clouds' : self.clouds},
-                self.level_sounds)
+            self.accumulator = 0
+            self.level = Level(grid, self.switch, self.level_assets, self.level_sounds, grid_key = grid_key)
 
     def run(self):
         while True:
-            dt = self.clock.tick() / 1000
+            # long frames are clamped so a spike can't queue up a burst of steps
+            dt = min(self.clock.tick() / 1000, MAX_FRAME_TIME)
+
+            # the editor hands back the rects it redrew, None after a full redraw
+            rects = None
 
             if self.editor_active:
-                self.editor.run(dt)
+                rects = self.editor.run(dt)
             else:
-                self.level.run(dt)
+                self.level.event_loop()
+
+                self.accumulator += dt
+                while self.accumulator >= SIM_STEP:
+                    self.level.update(SIM_STEP)
+                    self.accumulator -= SIM_STEP
+
+                self.level.draw(self.accumulator / SIM_STEP)
             
+            music.update(dt)
+
+            transition = self.trans.active
             self.trans.display(dt)
-            pg.display.update()
+
+            # the transition paints over the whole screen
+            if transition or self.trans.active:
+                self.editor.full_redraw = True
+                rects = None
+
+            if rects is None:
+                pg.display.update()
+            else:
+                pg.display.update(rects)
 
 class Transition:
     def __init__(self, toggle):
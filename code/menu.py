@@ -1,6 +1,6 @@
 import pygame as pg
-from pygame.image import load
 from settings import *
+from assets import assets
 
 class Menu:
     def __init__(self):
@@ -11,13 +11,14 @@ class Menu:
 
     def create_data(self):
         self.menu_surfs = {}
+        assets.preload([value['menu_surf'] for value in EDITOR_DATA.values() if value['menu']], 'menu')
         
         for key, value in EDITOR_DATA.items():
               if value['menu']:
                     if not value['menu'] in self.menu_surfs:
-                        self.menu_surfs[value['menu']] = [(key,load(value['menu_surf']))]
+                        self.menu_surfs[value['menu']] = [(key,assets.image(value['menu_surf'], 'menu'))]
                     else:
-                        self.menu_surfs[value['menu']].append((key,load(value['menu_surf'])))
+                        self.menu_surfs[value['menu']].append((key,assets.image(value['menu_surf'], 'menu')))
 
     def create_buttons(self):
         # general menu
@@ -41,6 +42,11 @@ class Menu:
         Button(self.enemy_button_rect, self.buttons, self.menu_surfs['enemy'])
         Button(self.palm_button_rect, self.buttons, self.menu_surfs['palm fg'], self.menu_surfs['palm bg'])
 
+        # the whole menu is rendered once and redrawn only when the selection or a button changes
+        self.surf_rect = self.rect.inflate(8, 8)
+        self.surf = pg.Surface(self.surf_rect.size, pg.SRCALPHA)
+        self.shown = None
+
     def click(self, pos, button):
         for sprite in self.buttons:
             if sprite.rect.collidepoint(pos):
@@ -53,23 +59,32 @@ class Menu:
 
                 return sprite.get_id()
 
-    def highlight_ind(self, idx):
+    def highlight_ind(self, idx, surface, offset):
         if EDITOR_DATA[idx]['menu'] == 'terrain':
-            pg.draw.rect(self.display_surface, BUTTON_LINE_COLOR, self.tile_button_rect.inflate(4, 4), 5, 4)
+            pg.draw.rect(surface, BUTTON_LINE_COLOR, self.tile_button_rect.inflate(4, 4).move(offset), 5, 4)
         
         if EDITOR_DATA[idx]['menu'] == 'coin':
-            pg.draw.rect(self.display_surface, BUTTON_LINE_COLOR, self.coin_button_rect.inflate(4, 4), 5, 4)
+            pg.draw.rect(surface, BUTTON_LINE_COLOR, self.coin_button_rect.inflate(4, 4).move(offset), 5, 4)
 
         if EDITOR_DATA[idx]['menu'] == 'enemy':
-            pg.draw.rect(self.display_surface, BUTTON_LINE_COLOR, self.enemy_button_rect.inflate(4, 4), 5, 4)
+            pg.draw.rect(surface, BUTTON_LINE_COLOR, self.enemy_button_rect.inflate(4, 4).move(offset), 5, 4)
 
         if EDITOR_DATA[idx]['menu'] in ('palm bg', 'palm fg'):
-            pg.draw.rect(self.display_surface, BUTTON_LINE_COLOR, self.palm_button_rect.inflate(4, 4), 5, 4)
+            pg.draw.rect(surface, BUTTON_LINE_COLOR, self.palm_button_rect.inflate(4, 4).move(offset), 5, 4)
 
     def display(self, idx):
-        self.buttons.update()
-        self.buttons.draw(self.display_surface)
-        self.highlight_ind(idx)
+        shown = (idx, tuple(sprite.get_id() for sprite in self.buttons))
+
+        if shown != self.shown:
+            self.shown = shown
+            offset = (-self.surf_rect.left, -self.surf_rect.top)
+
+            self.surf.fill((0, 0, 0, 0))
+            self.buttons.update()
+            self.surf.blits([(sprite.image, sprite.rect.move(offset)) for sprite in self.buttons], doreturn = False)
+            self.highlight_ind(idx, self.surf, offset)
+
+        self.display_surface.blit(self.surf, self.surf_rect)
 
 class Button(pg.sprite.Sprite):
 	def __init__(self, rect, group, items, items_alt = None):
@@ -81,6 +96,7 @@ class Button(pg.sprite.Sprite):
 		self.items = {'main': items, 'alt': items_alt}
 		self.index = 0
 		self.main_active = True
+		self.shown = None
 
 	def get_id(self):
 		return self.items['main' if self.main_active else 'alt'][self.index][0]
@@ -90,6 +106,11 @@ class Button(pg.sprite.Sprite):
 		self.index = 0 if self.index >= len(self.items['main' if self.main_active else 'alt']) else self.index
 
 	def update(self):
+		# only redrawn when another item is shown
+		if self.shown == self.get_id():
+			return
+		self.shown = self.get_id()
+
 		self.image.fill(BUTTON_BG_COLOR)
 		surf = self.items['main' if self.main_active else 'alt'][self.index][1]
 		rect = surf.get_rect(center = (self.rect.width / 2, self.rect.height / 2))
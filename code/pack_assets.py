@@ -0,0 +1,82 @@
+# offline step: packs every image under ../graphics into a few atlas sheets plus an index,
+# run again from the code folder whenever the graphics change
+import os
+import json
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame as pg
+from settings import *
+from assets import walk_sorted
+
+def pack(sizes, sheet_size, padding = 1):
+    # shelf packing, tallest images first, returns (sheet, x, y) per image
+    order = sorted(range(len(sizes)), key = lambda idx: (-sizes[idx][1], -sizes[idx][0], idx))
+    places = [None] * len(sizes)
+    sheet, x, y, shelf_height = 0, 0, 0, 0
+
+    for idx in order:
+        width, height = sizes[idx]
+        if width > sheet_size or height > sheet_size:
+            raise ValueError(f'image {width}x{height} does not fit a {sheet_size} atlas sheet')
+
+        if x + width > sheet_size:
+            x, y, shelf_height = 0, y + shelf_height + padding, 0
+
+        if y + height > sheet_size:
+            sheet, x, y, shelf_height = sheet + 1, 0, 0, 0
+
+        places[idx] = (sheet, x, y)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+
+    return places
+
+def pack_assets(source = '../graphics', index_path = ATLAS_INDEX, sheet_size = ATLAS_SIZE):
+    folder = os.path.dirname(index_path)
+    os.makedirs(folder, exist_ok = True)
+
+    folders = {}
+    files = []
+    for path, subs, names in walk_sorted(source):
+        if os.path.abspath(path).startswith(os.path.abspath(folder)):
+            subs.clear()
+            continue
+
+        subs[:] = [sub for sub in subs if not os.path.abspath(f'{path}/{sub}').startswith(os.path.abspath(folder))]
+        names = [name for name in names if name.endswith('.png')]
+        folders[path] = (list(subs), names)
+        files.extend(f'{path}/{name}' for name in names)
+
+    surfs = [pg.image.load(file) for file in files]
+    places = pack([surf.get_size() for surf in surfs], sheet_size)
+
+    # sheets are cropped to what they use
+    sheet_count = max((sheet for sheet, x, y in places), default = -1) + 1
+    extents = [[0, 0] for _ in range(sheet_count)]
+    for surf, (sheet, x, y) in zip(surfs, places):
+        extents[sheet][0] = max(extents[sheet][0], x + surf.get_width())
+        extents[sheet][1] = max(extents[sheet][1], y + surf.get_height())
+
+    sheets = [pg.Surface(extent, pg.SRCALPHA) for extent in extents]
+    for surf, (sheet, x, y) in zip(surfs, places):
+        # max onto the transparent sheet copies the pixels without blending
+        sheets[sheet].blit(surf.convert_alpha(), (x, y), special_flags = pg.BLEND_RGBA_MAX)
+
+    names = [f'atlas_{idx}.png' for idx in range(sheet_count)]
+    for name, sheet in zip(names, sheets):
+        pg.image.save(sheet, f'{folder}/{name}')
+
+    index = {
+        'sheets' : names,
+        'frames' : {file : [sheet, x, y, *surf.get_size()] for file, surf, (sheet, x, y) in zip(files, surfs, places)},
+        'folders' : folders,
+    }
+    with open(index_path, 'w') as file:
+        json.dump(index, file, indent = 1)
+
+    return index
+
+if __name__ == '__main__':
+    pg.init()
+    pg.display.set_mode((1, 1))
+    index = pack_assets()
+    print(f"packed {len(index['frames'])} images into {len(index['sheets'])} sheets")
@@ -0,0 +1,37 @@
+class SpritePool:
+    # hands out released sprites again, pooled classes implement reset() with their constructor arguments
+    def __init__(self, factory):
+        self.factory = factory
+        self.free = []
+
+        # stats
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+
+    def acquire(self, *args):
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+            self.reused += 1
+        else:
+            sprite = self.factory(*args)
+            sprite.pool = self
+            self.created += 1
+
+        return sprite
+
+    def release(self, sprite):
+        if sprite.alive():
+            sprite.kill()
+            self.free.append(sprite)
+            self.released += 1
+
+    def stats(self):
+        return {
+            'created' : self.created,
+            'reused' : self.reused,
+            'released' : self.released,
+            'in use' : self.created - len(self.free),
+            'free' : len(self.free),
+        }
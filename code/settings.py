@@ -4,6 +4,64 @@ WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 720
 ANIM_SPEED = 8
 
+# the level simulates in fixed steps, rendering interpolates between the last two
+SIM_RATE = 120
+SIM_STEP = 1 / SIM_RATE
+MAX_FRAME_TIME = 0.25
+DRAW_MARGIN = TILE_SIZE * 2
+
+# static terrain is baked into square chunks of CHUNK_SIZE tiles
+CHUNK_SIZE = 16
+CHUNK_PX = CHUNK_SIZE * TILE_SIZE
+
+# entities wake up within WAKE_DISTANCE of the screen and fall asleep beyond SLEEP_DISTANCE
+WAKE_DISTANCE = TILE_SIZE * 6
+SLEEP_DISTANCE = TILE_SIZE * 10
+
+# big levels are streamed, chunks within STREAM_LOAD_DISTANCE of the screen get built
+# and the ones beyond STREAM_KEEP_DISTANCE evicted
+STREAMING_MIN_TILES = 5000
+STREAM_LOAD_DISTANCE = CHUNK_PX
+STREAM_KEEP_DISTANCE = CHUNK_PX * 2
+
+# the idle editor only redraws and updates the area that changed,
+# once that area covers more than this share of the window the whole screen is redrawn
+EDITOR_DIRTY_RECTS = True
+EDITOR_MAX_DIRTY_AREA = 0.75
+
+# ctrl + s saves the editor canvas and the exported grid, ctrl + o loads the canvas, ctrl + l plays the saved grid
+EDITOR_SAVE_FILE = '../levels/canvas.lvl'
+LEVEL_SAVE_FILE = '../levels/level.lvl'
+
+# compiled levels are cached on disk by grid hash, an empty folder turns the cache off
+LEVEL_CACHE_DIR = '../cache'
+LEVEL_CACHE_FILES = 8
+
+# undo history, the oldest steps are dropped past either bound, a single step over the byte bound clears it
+UNDO_MAX_BYTES = 1024 * 1024
+UNDO_MAX_STEPS = 500
+
+# a flood fill that would cover more cells than this is dropped, ctrl + click into open space stays cheap
+FILL_MAX_CELLS = 100000
+
+# image decoding threads, ASSET_STATS prints load time and memory per asset group at startup
+ASSET_WORKERS = 4
+ASSET_STATS = False
+
+# music is streamed and crossfaded, effects share a few voices with a cap per effect
+EDITOR_MUSIC = '../audio/Explorer.ogg'
+LEVEL_MUSIC = '../audio/SuperHero.ogg'
+MUSIC_FADE = 0.6
+SFX_VOICES = 8
+SFX_LIMITS = {'coin' : 2, 'hit' : 1, 'jump' : 1}
+
+# atlas written by pack_assets.py, without it images are loaded from their own files
+ATLAS_INDEX = '../graphics/atlas/index.json'
+ATLAS_SIZE = 2048
+
+# memory bound for the shared flip/scale/rotate cache
+TRANSFORM_CACHE_BYTES = 32 * 1024 * 1024
+
 # editor graphics
 EDITOR_DATA = {
 	0: {'style': 'player', 'type': 'object', 'menu': None, 'menu_surf': None, 'preview': None, 'graphics': '../graphics/player/idle_right'},
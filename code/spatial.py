@@ -0,0 +1,66 @@
+import pygame as pg
+from settings import *
+
+class SpatialGroup(pg.sprite.Group):
+    # sprite group that also buckets its sprites into TILE_SIZE cells
+    def __init__(self, *sprites):
+        self.cells = {}
+        self.spans = {}
+
+        super().__init__(*sprites)
+
+    def get_span(self, rect):
+        return rect.left // TILE_SIZE, rect.top // TILE_SIZE, (rect.right - 1) // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE
+
+    def insert(self, sprite, span):
+        for col in range(span[0], span[2] + 1):
+            for row in range(span[1], span[3] + 1):
+                self.cells.setdefault((col, row), {})[sprite] = None
+
+    def discard(self, sprite, span):
+        for col in range(span[0], span[2] + 1):
+            for row in range(span[1], span[3] + 1):
+                cell = self.cells[(col, row)]
+                del cell[sprite]
+
+                if not cell:
+                    del self.cells[(col, row)]
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite, layer)
+
+        span = self.get_span(sprite.rect)
+        self.spans[sprite] = span
+        self.insert(sprite, span)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.discard(sprite, self.spans.pop(sprite))
+
+    def relocate(self, sprite):
+        # only touches the buckets when the sprite crossed a cell border
+        span = self.get_span(sprite.rect)
+
+        if span != self.spans[sprite]:
+            self.discard(sprite, self.spans[sprite])
+            self.insert(sprite, span)
+            self.spans[sprite] = span
+
+    def near(self, rect):
+        left, top, right, bottom = self.get_span(rect)
+        found = {}
+
+        for col in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                if (col, row) in self.cells:
+                    found.update(self.cells[(col, row)])
+
+        return list(found)
+
+    def collide(self, rect):
+        return [sprite for sprite in self.near(rect) if sprite.rect.colliderect(rect)]
+
+    def collide_point(self, point):
+        cell = self.cells.get((int(point[0] // TILE_SIZE), int(point[1] // TILE_SIZE)), {})
+
+        return [sprite for sprite in cell if sprite.rect.collidepoint(point)]
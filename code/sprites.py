@@ -2,58 +2,81 @@ import pygame as pg
 from pygame.math import Vector2 as vector
 from settings import *
 from timer import Timer
-from random import choice, randint
+from spatial import SpatialGroup
+from support import get_mask, get_silhouette, transforms
+from random import choice
 
 class Generic(pg.sprite.Sprite):
-    def __init__(self, pos, surf, group, z = LEVEL_LAYERS['main']):
-        super().__init__(group)
+    # sprites far away from the camera are put to sleep unless this is set
+    always_active = False
+
+    # moving sprites keep the rect of the previous simulation step for render interpolation
+    old_rect = None
 
+    # set by SpritePool for reusable sprites
+    pool = None
+
+    def __init__(self, pos, surf, group, z = LEVEL_LAYERS['main']):
+        # z and rect are read by the groups when the sprite is added, so they have to exist first
+        self.z = z
         self.image = surf
         self.rect = self.image.get_rect(topleft = pos)
-        self.z = z
-
-class Block(Generic):
-    def __init__(self, pos, size, group):
-        surf = pg.Surface(size)
 
-        super().__init__(pos, surf, group)
+        super().__init__(group)
 
-class Cloud(Generic):
-    def __init__(self, pos, surf, group, left_limit):
-        super().__init__(pos, surf, group, LEVEL_LAYERS['clouds'])
+    def relocate(self):
+        # keeps the spatial groups in sync after the rect moved
+        for group in self.groups():
+            if isinstance(group, SpatialGroup):
+                group.relocate(self)
 
-        self.left_limit = left_limit
-        self.pos = vector(self.rect.topleft)
-        self.speed = randint(20, 30)
+    def release(self):
+        if self.pool:
+            self.pool.release(self)
+        else:
+            self.kill()
 
-    def update(self, dt):
-        self.pos.x -= self.speed * dt
-        self.rect.x = round(self.pos.x)
+class Block(pg.sprite.Sprite):
+    # collision only, never drawn
+    def __init__(self, pos, size, group):
+        self.rect = pg.Rect(pos, size)
 
-        if self.rect.x <= self.left_limit:
-            self.kill()
+        super().__init__(group)
 
 class Animated(Generic):
-    def __init__(self, assets, pos, group, z = LEVEL_LAYERS['main']):
+    # always in phase, the current frame comes from the shared animation clock
+    def __init__(self, assets, pos, group, clock, z = LEVEL_LAYERS['main']):
         self.animation_frames = assets
-        self.frame_idx = 0
+        self.clock = clock
+        self.clock.register(assets)
 
-        super().__init__(pos, self.animation_frames[self.frame_idx], group, z)
+        super().__init__(pos, self.animation_frames[0], group, z)
 
-    def animate(self, dt):
-        self.frame_idx += ANIM_SPEED * dt
-        self.frame_idx = 0 if self.frame_idx >= len(self.animation_frames) else self.frame_idx
-        self.image = self.animation_frames[int(self.frame_idx)]
+    @property
+    def image(self):
+        return self.clock.frame(self.animation_frames)
 
-    def update(self, dt):
-        self.animate(dt)
+    @image.setter
+    def image(self, surf):
+        # set by Generic, the clock owns the frames
+        pass
 
-class Particle(Animated):
+class Particle(Generic):
     def __init__(self, assets, pos, group):
-        super().__init__(assets, pos, group)
+        self.animation_frames = assets
+        self.frame_idx = 0
+
+        super().__init__(pos, self.animation_frames[self.frame_idx], group)
         
         self.rect = self.image.get_rect(center = pos)
 
+    def reset(self, assets, pos, group):
+        self.animation_frames = assets
+        self.frame_idx = 0
+        self.image = self.animation_frames[self.frame_idx]
+        self.rect = self.image.get_rect(center = pos)
+        self.add(group)
+
     def animate(self, dt):
         self.frame_idx += ANIM_SPEED * dt
         
@@ -61,19 +84,23 @@ class Particle(Animated):
             self.image = self.animation_frames[int(self.frame_idx)]
 
         else:
-            self.kill()
+            self.release()
+
+    def update(self, dt):
+        self.animate(dt)
 
 class Coin(Animated):
-    def __init__(self, coin_type, assets, pos, group):
-        super().__init__(assets, pos, group)
+    def __init__(self, coin_type, assets, pos, group, clock):
+        super().__init__(assets, pos, group, clock)
         
         self.rect = self.image.get_rect(center = pos)
+        self.relocate()
         self.coin_type = coin_type
 
 class Spikes(Generic):
     def __init__(self, surf, pos, group):
         super().__init__(pos, surf, group)
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = get_mask(self.image)
 
 class Tooth(Generic):
     def __init__(self, assets, pos, group, collision_sprites):
@@ -85,17 +112,19 @@ class Tooth(Generic):
         super().__init__(pos, surf, group)
 
         self.rect.bottom = self.rect.top + TILE_SIZE
-        self.mask = pg.mask.from_surface(self.image)
+        self.relocate()
+        self.mask = get_mask(self.image)
 
         # movement
         self.direction = vector(choice((1, -1)), 0)
         self.orient = 'left' if self.direction.x < 0 else 'right'
         self.pos = vector(self.rect.topleft)
+        self.old_rect = self.rect.copy()
         self.speed = 120
         self.collision_sprites = collision_sprites
 
         # destroy tooth if not on floor
-        if not [sprite for sprite in collision_sprites if sprite.rect.collidepoint(self.rect.midbottom + vector(0, 10))]:
+        if not collision_sprites.collide_point(self.rect.midbottom + vector(0, 10)):
             self.kill()
 
     def animate(self, dt):
@@ -103,7 +132,7 @@ class Tooth(Generic):
         self.frame_idx += ANIM_SPEED * dt
         self.frame_idx = 0 if self.frame_idx >= len(animation) else self.frame_idx
         self.image = animation[int(self.frame_idx)]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = get_mask(self.image)
 
     def move(self, dt):
         right_gap = self.rect.bottomright + vector(1, 1)
@@ -112,16 +141,16 @@ class Tooth(Generic):
         left_block = self.rect.midleft + vector(-1, 0)
 
         if self.direction.x > 0:
-            floor_sprites = [sprite for sprite in self.collision_sprites if sprite.rect.collidepoint(right_gap)]
-            wall_sprites = [sprite for sprite in self.collision_sprites if sprite.rect.collidepoint(right_block)]
+            floor_sprites = self.collision_sprites.collide_point(right_gap)
+            wall_sprites = self.collision_sprites.collide_point(right_block)
 
             if wall_sprites or not floor_sprites:
                 self.direction.x *= -1
                 self.orient = 'left'
         
         if self.direction.x < 0:
-            floor_sprites = [sprite for sprite in self.collision_sprites if sprite.rect.collidepoint(left_gap)]
-            wall_sprites = [sprite for sprite in self.collision_sprites if sprite.rect.collidepoint(left_block)]
+            floor_sprites = self.collision_sprites.collide_point(left_gap)
+            wall_sprites = self.collision_sprites.collide_point(left_block)
 
             if wall_sprites or not floor_sprites:
                 self.direction.x *= -1
@@ -129,19 +158,30 @@ class Tooth(Generic):
 
         self.pos.x += self.direction.x * self.speed * dt
         self.rect.x = round(self.pos.x)
+        self.relocate()
+
+    def save_state(self):
+        return self.pos.x, self.direction.x, self.orient
+
+    def load_state(self, state):
+        self.pos.x, self.direction.x, self.orient = state
+        self.rect.x = round(self.pos.x)
+        self.old_rect.topleft = self.rect.topleft
+        self.relocate()
 
     def update(self, dt):
+        self.old_rect.topleft = self.rect.topleft
         self.animate(dt)
         self.move(dt)
 
 class Shell(Generic):
-    def __init__(self, orient, assets, pos, group, pearl_surf, damage_sprites):
+    def __init__(self, orient, assets, pos, group, pearl_surf, damage_sprites, pearl_pool):
         self.orient = orient
         self.animation_frames = assets.copy()
 
         if orient == 'right':
             for key, value in self.animation_frames.items():
-                self.animation_frames[key] = [pg.transform.flip(surf, True, False) for surf in value]
+                self.animation_frames[key] = [transforms.flip(surf, True, False) for surf in value]
 
         self.frame_idx = 0
         self.status = 'idle'
@@ -149,12 +189,16 @@ class Shell(Generic):
         super().__init__(pos, self.animation_frames[self.status][self.frame_idx], group)
 
         self.rect.bottom = self.rect.top + TILE_SIZE
+        self.relocate()
 
         # pearl
         self.pearl_surf = pearl_surf
+        self.pearl_pool = pearl_pool
         self.has_shot = False
         self.cooldown = Timer(2000)
-        self.damage_group = damage_sprites
+
+        # groups() is unordered, so the camera group is taken from the list passed in
+        self.pearl_groups = [group[0], damage_sprites]
 
     def animate(self, dt):
         animation = self.animation_frames[self.status]
@@ -172,7 +216,7 @@ class Shell(Generic):
         if int(self.frame_idx) == 2 and self.status == 'attack' and not self.has_shot:
             pearl_direction = vector(-1, 0) if self.orient == 'left' else vector(1, 0)
             offset = (pearl_direction * 50) + vector(0, -10) if self.orient == 'left' else (pearl_direction * 20) + vector(0, -10)
-            Pearl(self.rect.center + offset, pearl_direction, self.pearl_surf, [self.groups()[0], self.damage_group])
+            self.pearl_pool.acquire(self.rect.center + offset, pearl_direction, self.pearl_surf, self.pearl_groups)
             self.has_shot = True
 
     def get_status(self):
@@ -187,12 +231,14 @@ class Shell(Generic):
         self.cooldown.update()
 
 class Pearl(Generic):
+    # pearls are pooled and released as soon as they leave the active region
     def __init__(self, pos, direction, surf, group):
         super().__init__(pos, surf, group)
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = get_mask(self.image)
 
         # movement
         self.pos = vector(self.rect.topleft)
+        self.old_rect = self.rect.copy()
         self.direction = direction
         self.speed = 150
 
@@ -200,16 +246,30 @@ class Pearl(Generic):
         self.timer = Timer(6000)
         self.timer.activate()
 
+    def reset(self, pos, direction, surf, group):
+        self.image = surf
+        self.rect.topleft = pos
+        self.old_rect.topleft = self.rect.topleft
+        self.pos.update(self.rect.topleft)
+        self.mask = get_mask(self.image)
+        self.direction = direction
+        self.timer.activate()
+        self.add(group)
+
     def update(self, dt):
+        self.old_rect.topleft = self.rect.topleft
         self.pos.x += self.direction.x * self.speed * dt
         self.rect.x = round(self.pos.x)
+        self.relocate()
         self.timer.update()
 
         if not self.timer.active:
-            self.kill()
+            self.release()
 
 class Player(Generic):
-    def __init__(self, pos, assets, group, collision_sprites, jump_sound):
+    always_active = True
+
+    def __init__(self, pos, assets, group, collision_sprites, jump_sound, get_keys = pg.key.get_pressed):
         self.animation_frames = assets
         self.frame_idx = 0
         self.status = 'idle'
@@ -218,11 +278,12 @@ class Player(Generic):
 
         super().__init__(pos, surf, group)
 
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = get_mask(self.image)
 
         # movement
         self.direction = vector()
         self.pos = vector(self.rect.center)
+        self.old_rect = self.rect.copy()
         self.speed = 300
         self.gravity = 4
         self.on_floor = False
@@ -234,6 +295,9 @@ class Player(Generic):
         # inv frames
         self.invul_timer = Timer(200)
 
+        # input
+        self.get_keys = get_keys
+
         # sound
         self.jump_sound = jump_sound
         self.jump_sound.set_volume(0.2)
@@ -242,6 +306,9 @@ class Player(Generic):
         if not self.invul_timer.active:
             self.invul_timer.activate()
             self.direction.y -= 1.5
+            return True
+
+        return False
 
     def get_status(self):
         if self.direction.y < 0:
@@ -258,16 +325,12 @@ class Player(Generic):
         current_state = self.animation_frames[f'{self.status}_{self.orient}']
         self.frame_idx += ANIM_SPEED * dt
         self.frame_idx = 0 if self.frame_idx >= len(current_state) else self.frame_idx
-        self.image = current_state[int(self.frame_idx)]
-        self.mask = pg.mask.from_surface(self.image)
-
-        if self.invul_timer.active:
-            surf = self.mask.to_surface()
-            surf.set_colorkey('black')
-            self.image = surf
+        frame = current_state[int(self.frame_idx)]
+        self.mask = get_mask(frame)
+        self.image = get_silhouette(frame) if self.invul_timer.active else frame
 
     def inputs(self):
-        keys = pg.key.get_pressed()
+        keys = self.get_keys()
 
         if keys[pg.K_RIGHT] or keys[pg.K_d]:
             self.direction.x = 1
@@ -303,11 +366,12 @@ class Player(Generic):
 
     def check_floor(self):
         floor_rect = pg.Rect((self.hitbox.bottomleft), (self.hitbox.width, 2))
-        floor_sprites = [sprite for sprite in self.collision_sprites if sprite.rect.colliderect(floor_rect)]
+        floor_sprites = self.collision_sprites.collide(floor_rect)
         self.on_floor = True if floor_sprites else False
 
     def collision(self, direction):
-        for sprite in self.collision_sprites:
+        # the hitbox gets pushed while resolving, so look a tile further around it
+        for sprite in self.collision_sprites.near(self.hitbox.inflate(TILE_SIZE * 2, TILE_SIZE * 2)):
             if sprite.rect.colliderect(self.hitbox):
                 if direction == 'horizontal':
                     if self.direction.x > 0:
@@ -330,6 +394,7 @@ class Player(Generic):
                     self.direction.y = 0
 
     def update(self, dt):
+        self.old_rect.topleft = self.rect.topleft
         self.inputs()
         self.apply_gravity(dt)
         self.move(dt)
@@ -0,0 +1,112 @@
+from settings import *
+from chunks import chunk_key, chunk_range
+
+class LevelStreamer:
+    # loads the world chunks around the camera and evicts the rest
+    def __init__(self, level, compiled, streaming):
+        self.level = level
+        self.streaming = streaming
+        self.camera_key = None
+
+        # grid entries per chunk
+        self.terrain = compiled['terrain']
+        self.water = compiled['water']
+        self.entities = compiled['entities']
+        self.blocks = compiled['blocks']
+
+        # loaded chunks
+        self.terrain_loaded = {}
+        self.entities_loaded = {}
+        self.spawned = set()
+
+        # entity state that has to outlive its chunk
+        self.removed = set()
+        self.saved = {}
+
+    def load_all(self):
+        # terrain first, enemies check for floor when they spawn
+        for key in self.terrain.keys() | self.water.keys():
+            self.load_terrain(key)
+
+        for key in self.entities:
+            self.load_entities(key)
+
+    def update(self, camera):
+        if not self.streaming or chunk_key(camera.center) == self.camera_key:
+            return
+
+        self.camera_key = chunk_key(camera.center)
+
+        # terrain reaches one chunk further so entities at the edge always have floor
+        load_area = camera.inflate(STREAM_LOAD_DISTANCE * 2, STREAM_LOAD_DISTANCE * 2)
+        keep_area = camera.inflate(STREAM_KEEP_DISTANCE * 2, STREAM_KEEP_DISTANCE * 2)
+
+        terrain_keys = set(chunk_range(load_area.inflate(CHUNK_PX * 2, CHUNK_PX * 2)))
+        for key in terrain_keys - self.terrain_loaded.keys():
+            self.load_terrain(key)
+
+        entity_keys = set(chunk_range(load_area))
+        for key in entity_keys - self.entities_loaded.keys():
+            self.load_entities(key)
+
+        keep_keys = set(chunk_range(keep_area))
+        for key in self.entities_loaded.keys() - keep_keys:
+            self.evict_entities(key)
+
+        keep_keys = set(chunk_range(keep_area.inflate(CHUNK_PX * 2, CHUNK_PX * 2)))
+        for key in self.terrain_loaded.keys() - keep_keys:
+            self.evict_terrain(key)
+
+    def load_terrain(self, key):
+        self.terrain_loaded[key] = self.level.bake_chunk(key, self.terrain.get(key, []), self.water.get(key, []), self.blocks.get(key, []))
+
+    def evict_terrain(self, key):
+        self.level.evict_chunk(key, self.terrain_loaded.pop(key))
+
+    def load_entities(self, key):
+        self.entities_loaded[key] = []
+
+        for layer_name, pos, data in self.entities.get(key, []):
+            origin = (layer_name, pos)
+
+            if origin in self.removed or origin in self.spawned:
+                continue
+
+            sprites = self.level.spawn(layer_name, pos, data)
+
+            # enemies without floor remove themselves on spawn
+            if sprites and not sprites[0].alive():
+                self.removed.add(origin)
+                continue
+
+            if origin in self.saved:
+                sprites[0].load_state(self.saved.pop(origin))
+
+            for sprite in sprites:
+                sprite.origin = origin
+
+            self.entities_loaded[key].extend(sprites)
+            self.spawned.add(origin)
+
+    def evict_entities(self, key):
+        for sprite in self.entities_loaded.pop(key):
+            if not sprite.alive():
+                continue
+
+            # moving enemies stay if they walked into a chunk that is still loaded
+            if hasattr(sprite, 'save_state'):
+                current_key = chunk_key(sprite.rect.center)
+
+                if current_key in self.entities_loaded:
+                    self.entities_loaded[current_key].append(sprite)
+                    continue
+
+                self.saved[sprite.origin] = sprite.save_state()
+
+            self.spawned.discard(sprite.origin)
+            sprite.kill()
+
+    def remove(self, sprite):
+        # for entities that are gone for good, like collected coins
+        self.removed.add(sprite.origin)
+        self.spawned.discard(sprite.origin)
@@ -1,24 +1,121 @@
 import pygame as pg
-from os import walk
+from collections import OrderedDict
+from settings import *
+from assets import assets
+from audio import VoicePool, SoundEffect
 
 def import_folder(path):
-    surface_list = []
-
-    for folder, sub, file in walk(path):
-        for img in file:
-            full_path = path + '/' + img
-            img_surf =  pg.image.load(full_path).convert_alpha()
-            surface_list.append(img_surf)
-    
-    return surface_list
+    return assets.folder(path)
 
 def import_folder_dict(path):
-    surface_dict = {}
-
-    for folder, sub, file in walk(path):
-        for img in file:
-            full_path = path + '/' + img
-            img_surf =  pg.image.load(full_path).convert_alpha()
-            surface_dict[img.split('.')[0]] = img_surf
-    
-    return surface_dict
\ No newline at end of file
+    return assets.folder_dict(path)
+
+# collision masks and invulnerability silhouettes, shared by every sprite showing the same frame
+mask_cache = {}
+silhouette_cache = {}
+
+def get_mask(surf):
+    if surf not in mask_cache:
+        mask_cache[surf] = pg.mask.from_surface(surf)
+
+    return mask_cache[surf]
+
+def get_silhouette(surf):
+    if surf not in silhouette_cache:
+        silhouette = get_mask(surf).to_surface().convert()
+        silhouette.set_colorkey('black')
+        silhouette_cache[surf] = silhouette
+
+    return silhouette_cache[surf]
+
+def cache_masks(frames, silhouettes = False):
+    # done once at load time so the sprites only do lookups
+    for surf in frames:
+        get_mask(surf)
+
+        if silhouettes:
+            get_silhouette(surf)
+
+class TransformCache:
+    # derived surfaces keyed by source surface and parameters, least recently used go first
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.surfs = OrderedDict()
+
+    def get_size(self, surf):
+        return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+    def get(self, key, transform):
+        if key in self.surfs:
+            self.surfs.move_to_end(key)
+            return self.surfs[key]
+
+        surf = transform()
+        self.surfs[key] = surf
+        self.bytes += self.get_size(surf)
+
+        while self.bytes > self.max_bytes and len(self.surfs) > 1:
+            old_key, old_surf = self.surfs.popitem(last = False)
+            self.bytes -= self.get_size(old_surf)
+
+        return surf
+
+    def flip(self, surf, flip_x, flip_y):
+        return self.get((surf, 'flip', flip_x, flip_y), lambda: pg.transform.flip(surf, flip_x, flip_y))
+
+    def scale(self, surf, size):
+        return self.get((surf, 'scale', tuple(size)), lambda: pg.transform.scale(surf, size))
+
+    def scale2x(self, surf):
+        return self.get((surf, 'scale2x'), lambda: pg.transform.scale2x(surf))
+
+    def rotate(self, surf, angle):
+        return self.get((surf, 'rotate', angle), lambda: pg.transform.rotate(surf, angle))
+
+transforms = TransformCache(TRANSFORM_CACHE_BYTES)
+
+def import_level_assets():
+    assets.preload(['../graphics/terrain', '../graphics/items', '../graphics/enemies', '../graphics/player', '../graphics/clouds'], 'level')
+
+    level_assets = {
+        'land' : import_folder_dict('../graphics/terrain/land'),
+        'water bottom' : assets.image('../graphics/terrain/water/water_bottom.png'),
+        'water top' : import_folder('../graphics/terrain/water/animation'),
+
+        # coins
+        'gold' : import_folder('../graphics/items/gold'),
+        'silver' : import_folder('../graphics/items/silver'),
+        'diamond' : import_folder('../graphics/items/diamond'),
+        'particle' : import_folder('../graphics/items/particle'),
+
+        # trees
+        'palms' : assets.subfolders('../graphics/terrain/palm'),
+
+        # enemies
+        'spikes' : assets.image('../graphics/enemies/spikes/spikes.png'),
+        'tooth' : assets.subfolders('../graphics/enemies/tooth'),
+        'shell' : assets.subfolders('../graphics/enemies/shell_left'),
+        'pearl' : assets.image('../graphics/enemies/pearl/pearl.png'),
+
+        # player
+        'player' : assets.subfolders('../graphics/player'),
+
+        # clouds
+        'clouds' : import_folder('../graphics/clouds'),
+    }
+
+    # masks
+    for frames in level_assets['player'].values():
+        cache_masks(frames, silhouettes = True)
+
+    for frames in level_assets['tooth'].values():
+        cache_masks(frames)
+
+    cache_masks([level_assets['spikes'], level_assets['pearl']])
+
+    return level_assets
+
+def import_level_sounds():
+    pool = VoicePool(SFX_VOICES)
+    return {name : SoundEffect(f'../audio/{name}.wav', pool, limit) for name, limit in SFX_LIMITS.items()}
@@ -1,6 +1,9 @@
 import pygame as pg
 
 class Timer:
+    # time source in ms, swapped for a simulated clock when running headless
+    get_ticks = staticmethod(pg.time.get_ticks)
+
     def __init__(self, duration):
         self.duration = duration
         self.active = False
@@ -8,14 +11,14 @@ class Timer:
 
     def activate(self):
         self.active = True
-        self.start_time = pg.time.get_ticks()
+        self.start_time = self.get_ticks()
 
     def deactivate(self):
         self.active = False
         self.start_time = 0
 
     def update(self):
-        current_time = pg.time.get_ticks()
+        current_time = self.get_ticks()
 
         if current_time - self.start_time >= self.duration:
             self.deactivate()
\ No newline at end of file